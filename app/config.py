@@ -1,43 +1,71 @@
-import os
+from functools import lru_cache
+from types import SimpleNamespace
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 
 class Settings(BaseSettings):
-    """项目配置类，管理环境变量和配置参数"""
+    """项目配置类，管理环境变量和配置参数
+
+    环境变量与.env文件由BaseSettings统一读取，这里只声明类型和默认值。
+    """
     # 基础配置
     PROJECT_NAME: str = "FastAPI 向量搜索微服务"
     PROJECT_VERSION: str = "0.1.0"
     DEBUG: bool = False
     
     # Milvus 配置
-    MILVUS_HOST: str = os.getenv("MILVUS_HOST", "localhost")
-    MILVUS_PORT: int = int(os.getenv("MILVUS_PORT", "19530"))
-    MILVUS_COLLECTION_NAME: str = os.getenv("MILVUS_COLLECTION_NAME", "questions")
-    MILVUS_INDEX_TYPE: str = os.getenv("MILVUS_INDEX_TYPE", "IVF_FLAT")
-    MILVUS_METRIC_TYPE: str = os.getenv("MILVUS_METRIC_TYPE", "COSINE")
-    MILVUS_NLIST: int = int(os.getenv("MILVUS_NLIST", "1024"))
-    MILVUS_BATCH_SIZE: int = int(os.getenv("MILVUS_BATCH_SIZE", "100"))
+    MILVUS_HOST: str = "localhost"
+    MILVUS_PORT: int = 19530
+    MILVUS_COLLECTION_NAME: str = "questions"
+    MILVUS_INDEX_TYPE: str = "IVF_FLAT"
+    MILVUS_METRIC_TYPE: str = "COSINE"
+    MILVUS_NLIST: int = 1024
+    MILVUS_VECTOR_TYPE: str = "FLOAT_VECTOR"  # 新建集合的向量类型：FLOAT_VECTOR 或 FLOAT16_VECTOR
+    MILVUS_BATCH_SIZE: int = 100
+    MILVUS_PROBE_INTERVAL: int = 30  # 秒，连接探测间隔
+    MILVUS_FLUSH_INTERVAL: int = 5  # 秒，后台刷新间隔
+    MILVUS_FLUSH_MAX_PENDING: int = 1000  # 待刷新条数达到该值时立即刷新
+    MILVUS_ID_BLOOM_ENABLED: bool = False  # 启用题目ID布隆过滤器（仅适用于单进程写入）
     
     # 服务配置
-    APP_HOST: str = os.getenv("APP_HOST", "0.0.0.0")
-    APP_PORT: int = int(os.getenv("APP_PORT", "8000"))
-    WORKERS: int = int(os.getenv("WORKERS", "4"))
+    APP_HOST: str = "0.0.0.0"
+    APP_PORT: int = 8000
+    WORKERS: int = 4
+    
+    # 向量化配置
+    CLIP_MODEL_NAME: str = "openai/clip-vit-base-patch16"
+    CLIP_DEVICE: str = "auto"  # auto: 有CUDA时使用GPU+FP16，否则使用CPU
+    VECTORIZE_BATCH_SIZE: int = 32  # 单次前向推理的最大图片数
+    VECTORIZE_PIXEL_BUDGET: int = 64_000_000  # 单批已解码图片的像素总数上限
+    
+    # 批量添加时每凑满多少个题目处理一次（应为VECTORIZE_BATCH_SIZE的倍数，
+    # 多于一个推理批次时解码与推理才能流水线重叠）
+    BATCH_STREAM_CHUNK_SIZE: int = 128
     
     # 缓存配置
-    CACHE_SIZE: int = int(os.getenv("CACHE_SIZE", "1000"))
-    CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))  # 秒
+    CACHE_SIZE: int = 1000
+    CACHE_TTL: int = 3600  # 秒
     
     # 限流配置
-    RATE_LIMIT: str = os.getenv("RATE_LIMIT", "100/minute")
+    RATE_LIMIT: str = "100/minute"
     
     # 监控配置
-    PROMETHEUS_ENABLED: bool = os.getenv("PROMETHEUS_ENABLED", "false").lower() == "true"
+    PROMETHEUS_ENABLED: bool = False
     
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """获取配置实例，每个进程只解析一次环境变量和.env文件"""
+    return Settings()
+
+
 # 全局配置实例
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
+
+# 配置快照：普通命名空间，属性访问不经过Pydantic，供运行时路径使用
+CFG = SimpleNamespace(**settings.model_dump())
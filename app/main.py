@@ -1,40 +1,44 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+import ijson
+import msgspec
+import numpy as np
 import time
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 
-from .config import settings
+from .config import CFG
 from .models import (
-    QuestionRequest, BatchQuestionRequest, SearchRequest, 
-    SearchResponse, SearchResult, HealthResponse, StatsResponse
+    QuestionRequest, SearchRequest, SearchResponse,
+    HealthResponse, StatsResponse, MAX_BATCH_QUESTIONS
 )
 from .milvus_client import milvus_client
 from .pipelines import vector_pipeline
 from .utils import (
-    setup_logging, log_request_middleware, get_uptime,
-    global_stats, RateLimiter, generate_error_response
+    setup_logging, log_request_middleware, get_uptime, get_api_calls,
+    global_stats, RateLimiter, generate_error_response, json_response,
+    error_response, MsgspecJSONResponse
 )
 
 # 导入Prometheus指标集成模块
 from prometheus_fastapi_instrumentator import Instrumentator
 
 # 配置日志
-logger = setup_logging("INFO" if not settings.DEBUG else "DEBUG")
+logger = setup_logging("INFO" if not CFG.DEBUG else "DEBUG")
 
 # 创建FastAPI应用
 app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.PROJECT_VERSION,
-    description="基于FastAPI + Towhee + Milvus的向量搜索微服务",
+    title=CFG.PROJECT_NAME,
+    version=CFG.PROJECT_VERSION,
+    description="基于FastAPI + CLIP + Milvus的向量搜索微服务",
     docs_url="/docs",
     redoc_url="/redoc",
-    debug=settings.DEBUG
+    debug=CFG.DEBUG,
+    default_response_class=MsgspecJSONResponse
 )
 
-# 配置Prometheus指标收集器
-instrumentator = Instrumentator()
+# 配置Prometheus指标收集器（不统计指标端点自身的抓取请求）
+instrumentator = Instrumentator(excluded_handlers=["/metrics"])
 
 # 启用基本指标收集
 instrumentator.instrument(app).expose(app, endpoint="/metrics", include_in_schema=True)
@@ -52,7 +56,93 @@ app.add_middleware(
 app.middleware("http")(log_request_middleware)
 
 # 创建速率限制器
-rate_limiter = RateLimiter(settings.RATE_LIMIT)
+rate_limiter = RateLimiter(CFG.RATE_LIMIT)
+
+# 批量添加时每批处理的题目数量，向上取整为推理批大小的倍数，使每批都能填满推理批次
+BATCH_STREAM_CHUNK_SIZE = -(-CFG.BATCH_STREAM_CHUNK_SIZE // CFG.VECTORIZE_BATCH_SIZE) * CFG.VECTORIZE_BATCH_SIZE
+
+# 正在添加中的题目ID：重复检查与写入之间会等待向量化，
+# 先占用ID，避免并发请求在此期间通过检查并重复写入
+_pending_question_ids: Set[str] = set()
+
+# 请求体解码器，模块加载时创建一次
+_Q_DECODER = msgspec.json.Decoder(QuestionRequest)
+_SEARCH_DECODER = msgspec.json.Decoder(SearchRequest)
+
+
+def struct_schema(struct_type: type) -> Dict[str, Any]:
+    """生成msgspec模型的JSON Schema（嵌套模型内联展开，不含$ref）"""
+    _, components = msgspec.json.schema_components([struct_type], ref_template="{name}")
+    
+    def inline(node: Any) -> Any:
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(components[node["$ref"]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+    
+    return inline(components[struct_type.__name__])
+
+
+def openapi_request_body(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """端点直接读取原始请求体时，为OpenAPI文档补充请求体描述"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": schema}}
+        }
+    }
+
+
+def openapi_response(schema: Dict[str, Any]) -> Dict[int, Any]:
+    """端点直接返回Response时，为OpenAPI文档补充200响应体描述"""
+    return {200: {"content": {"application/json": {"schema": schema}}}}
+
+
+_QUESTION_SCHEMA = struct_schema(QuestionRequest)
+_BATCH_QUESTION_SCHEMA = {
+    "title": "BatchQuestionRequest",
+    "description": "批量添加题目的请求模型",
+    "type": "object",
+    "properties": {
+        "questions": {
+            "description": "题目列表",
+            "type": "array",
+            "items": _QUESTION_SCHEMA,
+            "minItems": 1,
+            "maxItems": MAX_BATCH_QUESTIONS
+        }
+    },
+    "required": ["questions"]
+}
+
+
+def reserve_question_ids(question_ids: List[str], reserved_ids: Set[str]):
+    """占用正在添加的题目ID，并记入本请求已占用的reserved_ids
+
+    同一请求内重复的ID（无论是否在同一批中）及已被其他请求占用的ID均返回409。
+    检查与占用之间没有await，事件循环内无需加锁。
+    """
+    for question_id in question_ids:
+        if question_id in reserved_ids:
+            raise HTTPException(
+                status_code=409,
+                detail={"error": "Conflict", "message": f"题目ID '{question_id}' 在请求中重复"}
+            )
+        if question_id in _pending_question_ids:
+            raise HTTPException(
+                status_code=409,
+                detail={"error": "Conflict", "message": f"题目ID '{question_id}' 已存在"}
+            )
+        reserved_ids.add(question_id)
+        _pending_question_ids.add(question_id)
+
+
+def release_question_ids(reserved_ids: Set[str]):
+    """写入完成或失败后释放本请求占用的题目ID"""
+    _pending_question_ids.difference_update(reserved_ids)
 
 
 # 依赖项：获取请求ID
@@ -67,37 +157,56 @@ def check_rate_limit(request: Request):
     client_ip = request.client.host
     if rate_limiter.is_rate_limited(client_ip):
         request_id = get_request_id(request)
-        error_response = generate_error_response(
+        error_detail = generate_error_response(
             429,
             "Rate Limit Exceeded",
-            f"超过请求限制: {settings.RATE_LIMIT}",
+            f"超过请求限制: {CFG.RATE_LIMIT}",
             request_id
         )
         raise HTTPException(
             status_code=429,
-            detail=error_response
+            detail=error_detail
+        )
+
+
+def validation_error(message: str, request: Request) -> HTTPException:
+    """构造422校验错误"""
+    return HTTPException(
+        status_code=422,
+        detail=generate_error_response(
+            422,
+            "Validation Error",
+            message,
+            get_request_id(request)
         )
+    )
+
+
+def decode_request_body(decoder: msgspec.json.Decoder, body: bytes, request: Request):
+    """解码并校验请求体，校验失败时返回422"""
+    try:
+        return decoder.decode(body)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise validation_error(str(e), request)
 
 
 # API端点
-@app.get("/health", response_model=HealthResponse, tags=["基础服务"])
+@app.get("/health", tags=["基础服务"], responses=openapi_response(struct_schema(HealthResponse)))
 async def health_check(request: Request):
     """服务健康检查端点"""
     try:
         # 检查Milvus连接
         milvus_status = "connected"
-        try:
-            milvus_client.connect()
-        except Exception:
+        if not milvus_client.is_healthy():
             milvus_status = "disconnected"
             logger.error("Milvus连接失败")
         
-        return HealthResponse(
+        return json_response(HealthResponse(
             status="healthy",
-            version=settings.PROJECT_VERSION,
+            version=CFG.PROJECT_VERSION,
             database=milvus_status,
             uptime=get_uptime()
-        )
+        ))
     except Exception as e:
         logger.error(f"健康检查失败: {str(e)}")
         raise HTTPException(
@@ -106,124 +215,169 @@ async def health_check(request: Request):
         )
 
 
-@app.get("/stats", response_model=StatsResponse, tags=["基础服务"])
+@app.get("/stats", tags=["基础服务"], responses=openapi_response(struct_schema(StatsResponse)))
 async def get_stats(request: Request):
     """获取服务统计信息"""
     try:
         # 获取Milvus统计信息
         milvus_stats = milvus_client.get_stats()
         
-        return StatsResponse(
+        return json_response(StatsResponse(
             question_count=milvus_stats["question_count"],
             collection_size=milvus_stats["collection_size"],
             avg_vector_size=milvus_stats["avg_vector_size"],
-            api_calls=global_stats["api_calls"],
+            api_calls=get_api_calls(),
             error_count=global_stats["error_count"]
-        )
+        ))
     except Exception as e:
         request_id = get_request_id(request)
         logger.error(f"获取统计信息失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=generate_error_response(
-                500,
-                "Internal Server Error",
-                str(e),
-                request_id
-            )
-        )
+        return error_response(500, "Internal Server Error", str(e), request_id)
 
 
-@app.post("/questions", status_code=201, tags=["题目管理"])
+@app.post(
+    "/questions", status_code=201, tags=["题目管理"],
+    openapi_extra=openapi_request_body(_QUESTION_SCHEMA)
+)
 async def add_question(
-    question: QuestionRequest,
     request: Request,
     _: None = Depends(check_rate_limit)
 ):
     """添加单个题目向量"""
+    question = decode_request_body(_Q_DECODER, await request.body(), request)
+    reserved_ids: Set[str] = set()
+    reserve_question_ids([question.question_id], reserved_ids)
     try:
         # 检查题目是否已存在
-        existing_question = milvus_client.get_by_id(question.question_id)
-        if existing_question:
+        if milvus_client.question_exists(question.question_id):
             raise HTTPException(
                 status_code=409,
                 detail={"error": "Conflict", "message": f"题目ID '{question.question_id}' 已存在"}
             )
         
         # 生成图片向量
-        vector = vector_pipeline.vectorize_image(question.image_base64)
+        vector = await vector_pipeline.avectorize_image(question.image_base64)
         
         # 插入Milvus
         milvus_client.insert(question.question_id, vector, question.metadata)
         
-        return {
+        return json_response({
             "message": "题目添加成功",
             "question_id": question.question_id
-        }
+        }, status_code=201)
     except HTTPException as e:
         # 重新抛出HTTP异常
         raise
     except Exception as e:
         request_id = get_request_id(request)
         logger.error(f"添加题目失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=generate_error_response(
-                500,
-                "Internal Server Error",
-                str(e),
-                request_id
+        return error_response(500, "Internal Server Error", str(e), request_id)
+    finally:
+        release_question_ids(reserved_ids)
+
+
+async def iter_batch_questions(request: Request):
+    """流式解析批量请求体，逐个产出校验后的题目，不在内存中保留完整请求体
+
+    使用ijson的推送式解析器：每收到一段请求体就喂给解析器，再取出已解析完整的题目。
+    """
+    count = 0
+    items = ijson.sendable_list()
+    parser = ijson.items_coro(items, "questions.item", use_float=True)
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            parser.send(chunk)
+            for item in items:
+                if count >= MAX_BATCH_QUESTIONS:
+                    raise validation_error(f"批量添加的题目数量不能超过{MAX_BATCH_QUESTIONS}个", request)
+                try:
+                    question = msgspec.convert(item, QuestionRequest)
+                except msgspec.ValidationError as e:
+                    raise validation_error(f"{e} - at `$.questions[{count}]`", request)
+                count += 1
+                yield question
+            del items[:]
+        # 请求体结束，检查JSON是否完整
+        parser.close()
+    except ijson.JSONError as e:
+        raise validation_error(f"无效的JSON请求体: {e}", request)
+    
+    if count == 0:
+        raise validation_error("题目列表不能为空", request)
+
+
+async def vectorize_question_chunk(
+    questions: List[QuestionRequest],
+    reserved_ids: Set[str]
+) -> List[Tuple[str, np.ndarray, Optional[Dict[str, Any]]]]:
+    """占用并检查一批题目是否已存在，并批量生成向量
+
+    占用的题目ID记入reserved_ids，由调用方在写入后统一释放。
+    """
+    question_ids = [question.question_id for question in questions]
+    reserve_question_ids(question_ids, reserved_ids)
+    
+    # 一次查询检查这批题目是否已存在
+    existing_ids = milvus_client.get_existing_ids(question_ids)
+    for question_id in question_ids:
+        if question_id in existing_ids:
+            raise HTTPException(
+                status_code=409,
+                detail={"error": "Conflict", "message": f"题目ID '{question_id}' 已存在"}
             )
-        )
+    
+    # 批量生成图片向量
+    vectors = await vector_pipeline.avectorize_images([question.image_base64 for question in questions])
+    
+    return [
+        (question.question_id, vector, question.metadata)
+        for question, vector in zip(questions, vectors)
+    ]
 
 
-@app.post("/questions/batch", status_code=201, tags=["题目管理"])
+@app.post(
+    "/questions/batch", status_code=201, tags=["题目管理"],
+    openapi_extra=openapi_request_body(_BATCH_QUESTION_SCHEMA)
+)
 async def batch_add_questions(
-    batch_request: BatchQuestionRequest,
     request: Request,
     _: None = Depends(check_rate_limit)
 ):
-    """批量添加题目向量"""
+    """批量添加题目向量
+
+    请求体边解析边处理：每凑满一批题目就检查重复并生成向量，随即释放Base64字符串，
+    只保留 (题目ID, 向量, 元数据)；全部通过后再一次性写入Milvus。
+    """
+    reserved_ids: Set[str] = set()
     try:
-        # 准备批量插入数据
         batch_data = []
-        for question in batch_request.questions:
-            # 检查题目是否已存在
-            existing_question = milvus_client.get_by_id(question.question_id)
-            if existing_question:
-                raise HTTPException(
-                    status_code=409,
-                    detail={"error": "Conflict", "message": f"题目ID '{question.question_id}' 已存在"}
-                )
-            
-            # 生成图片向量
-            vector = vector_pipeline.vectorize_image(question.image_base64)
-            
-            # 添加到批量数据
-            batch_data.append((question.question_id, vector, question.metadata))
+        chunk = []
+        async for question in iter_batch_questions(request):
+            chunk.append(question)
+            if len(chunk) >= BATCH_STREAM_CHUNK_SIZE:
+                batch_data.extend(await vectorize_question_chunk(chunk, reserved_ids))
+                chunk = []
+        if chunk:
+            batch_data.extend(await vectorize_question_chunk(chunk, reserved_ids))
         
         # 批量插入Milvus
         milvus_client.batch_insert(batch_data)
         
-        return {
+        return json_response({
             "message": "批量题目添加成功",
-            "count": len(batch_request.questions)
-        }
+            "count": len(batch_data)
+        }, status_code=201)
     except HTTPException as e:
         # 重新抛出HTTP异常
         raise
     except Exception as e:
         request_id = get_request_id(request)
         logger.error(f"批量添加题目失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=generate_error_response(
-                500,
-                "Internal Server Error",
-                str(e),
-                request_id
-            )
-        )
+        return error_response(500, "Internal Server Error", str(e), request_id)
+    finally:
+        release_question_ids(reserved_ids)
 
 
 @app.get("/questions/{question_id}", tags=["题目管理"])
@@ -242,22 +396,15 @@ async def get_question(
                 detail={"error": "Not Found", "message": f"题目ID '{question_id}' 不存在"}
             )
         
-        return question
+        # 直接编码Milvus返回的字典，不再经过响应模型
+        return json_response(question)
     except HTTPException as e:
         # 重新抛出HTTP异常
         raise
     except Exception as e:
         request_id = get_request_id(request)
         logger.error(f"查询题目失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=generate_error_response(
-                500,
-                "Internal Server Error",
-                str(e),
-                request_id
-            )
-        )
+        return error_response(500, "Internal Server Error", str(e), request_id)
 
 
 @app.delete("/questions/{question_id}", status_code=204, tags=["题目管理"])
@@ -283,30 +430,26 @@ async def delete_question(
     except Exception as e:
         request_id = get_request_id(request)
         logger.error(f"删除题目失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=generate_error_response(
-                500,
-                "Internal Server Error",
-                str(e),
-                request_id
-            )
-        )
+        return error_response(500, "Internal Server Error", str(e), request_id)
 
 
-@app.post("/search", response_model=SearchResponse, tags=["搜索功能"])
+@app.post(
+    "/search", tags=["搜索功能"],
+    openapi_extra=openapi_request_body(struct_schema(SearchRequest)),
+    responses=openapi_response(struct_schema(SearchResponse))
+)
 async def search_similar_questions(
-    search_request: SearchRequest,
     request: Request,
     _: None = Depends(check_rate_limit)
 ):
     """搜索相似题目"""
+    search_request = decode_request_body(_SEARCH_DECODER, await request.body(), request)
     try:
         # 记录搜索开始时间
         start_time = time.time()
         
         # 生成搜索图片的向量
-        search_vector = vector_pipeline.vectorize_image(search_request.image_base64)
+        search_vector = await vector_pipeline.avectorize_image(search_request.image_base64)
         
         # 执行搜索
         search_results = milvus_client.search(
@@ -318,40 +461,23 @@ async def search_similar_questions(
         # 计算搜索耗时
         search_time = time.time() - start_time
         
-        # 格式化搜索结果
-        results = [
-            SearchResult(
-                question_id=result["question_id"],
-                similarity=result["similarity"],
-                metadata=result["metadata"]
-            )
-            for result in search_results
-        ]
-        
-        return SearchResponse(
-            results=results,
-            total=len(results),
+        # milvus_client.search已返回最终的结果结构，属于可信数据，直接编码
+        return json_response(SearchResponse(
+            results=search_results,
+            total=len(search_results),
             search_time=search_time
-        )
+        ))
     except Exception as e:
         request_id = get_request_id(request)
         logger.error(f"搜索失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=generate_error_response(
-                500,
-                "Internal Server Error",
-                str(e),
-                request_id
-            )
-        )
+        return error_response(500, "Internal Server Error", str(e), request_id)
 
 
 # 全局异常处理
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """处理HTTP异常"""
-    return JSONResponse(
+    return MsgspecJSONResponse(
         status_code=exc.status_code,
         content=exc.detail if isinstance(exc.detail, dict) else {"error": str(exc.detail)}
     )
@@ -363,22 +489,14 @@ async def general_exception_handler(request: Request, exc: Exception):
     request_id = get_request_id(request)
     logger.error(f"未捕获的异常: {str(exc)}")
     
-    return JSONResponse(
-        status_code=500,
-        content=generate_error_response(
-            500,
-            "Internal Server Error",
-            "服务器内部错误，请联系管理员",
-            request_id
-        )
-    )
+    return error_response(500, "Internal Server Error", "服务器内部错误，请联系管理员", request_id)
 
 
 # 应用启动和关闭事件
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
-    logger.info(f"{settings.PROJECT_NAME} v{settings.PROJECT_VERSION} 启动中...")
+    logger.info(f"{CFG.PROJECT_NAME} v{CFG.PROJECT_VERSION} 启动中...")
     
     # 初始化Milvus连接
     try:
@@ -388,8 +506,11 @@ async def startup_event():
         logger.error(f"Milvus连接初始化失败: {str(e)}")
         # 在启动时不抛出异常，允许服务继续运行
     
-    logger.info(f"服务已成功启动，监听在 http://{settings.APP_HOST}:{settings.APP_PORT}")
-    logger.info(f"API文档: http://{settings.APP_HOST}:{settings.APP_PORT}/docs")
+    # 启动后台刷新任务
+    milvus_client.start_flush_task()
+    
+    logger.info(f"服务已成功启动，监听在 http://{CFG.APP_HOST}:{CFG.APP_PORT}")
+    logger.info(f"API文档: http://{CFG.APP_HOST}:{CFG.APP_PORT}/docs")
 
 
 @app.on_event("shutdown")
@@ -397,6 +518,12 @@ async def shutdown_event():
     """应用关闭事件"""
     logger.info("服务正在关闭...")
     
+    # 刷新剩余数据
+    try:
+        await milvus_client.stop_flush_task()
+    except Exception as e:
+        logger.error(f"刷新剩余数据失败: {str(e)}")
+    
     # 断开Milvus连接
     try:
         milvus_client.disconnect()
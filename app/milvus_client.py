@@ -1,46 +1,110 @@
 from pymilvus import (connections, Collection, CollectionSchema, FieldSchema,
                       DataType, utility, Index)
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
 from pymilvus.exceptions import (MilvusException, ConnectionNotExistException,
                                 CollectionNotExistException)
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
 import time
 import logging
+import threading
+import numpy as np
+from pybloom_live import ScalableBloomFilter
 from retry import retry
 
-from .config import settings
+from .config import CFG
+from .pipelines import vector_pipeline
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=128)
+def _compile_filter_template(keys: Tuple[str, ...], types: Tuple[type, ...]) -> Callable[..., str]:
+    """按过滤条件的键和值类型编译过滤表达式模板
+
+    同一形状的过滤条件只构建一次模板，调用时按位置填入过滤值。
+    """
+    conditions = []
+    for index, (key, value_type) in enumerate(zip(keys, types)):
+        # 转义键中的花括号，避免被当作格式化占位符
+        key = key.replace("{", "{{").replace("}", "}}")
+        if issubclass(value_type, str):
+            conditions.append(f"metadata['{key}'] == '{{{index}}}'")
+        else:
+            conditions.append(f"metadata['{key}'] == {{{index}}}")
+    return " && ".join(conditions).format
+
+
 class MilvusClient:
     """Milvus数据库客户端，提供连接管理和向量操作功能"""
-    def __init__(self):
-        """初始化Milvus客户端"""
-        self.host = settings.MILVUS_HOST
-        self.port = settings.MILVUS_PORT
-        self.collection_name = settings.MILVUS_COLLECTION_NAME
-        self.index_type = settings.MILVUS_INDEX_TYPE
-        self.metric_type = settings.MILVUS_METRIC_TYPE
-        self.nlist = settings.MILVUS_NLIST
-        self.vector_dim = 512  # CLIP模型的向量维度
+    def __init__(self, vector_dim: int):
+        """初始化Milvus客户端
+        
+        Args:
+            vector_dim: 向量维度，与向量化模型的输出维度一致
+        """
+        self.host = CFG.MILVUS_HOST
+        self.port = CFG.MILVUS_PORT
+        self.collection_name = CFG.MILVUS_COLLECTION_NAME
+        self.index_type = CFG.MILVUS_INDEX_TYPE
+        self.metric_type = CFG.MILVUS_METRIC_TYPE
+        self.nlist = CFG.MILVUS_NLIST
+        self.vector_dim = vector_dim
+        vector_type = DataType.__members__.get(CFG.MILVUS_VECTOR_TYPE)
+        if vector_type is None:
+            raise ValueError(f"不支持的向量类型: {CFG.MILVUS_VECTOR_TYPE}")
+        self._set_vector_type(vector_type)
         self.collection = None
         self.connected = False
         
+        # 上次成功探测连接的时间（monotonic），探测间隔内不再重复发起RPC
+        self._last_probe = 0.0
+        self._probe_interval = CFG.MILVUS_PROBE_INTERVAL
+        
+        # 延迟刷新：累计待刷新的插入条数，由后台任务定期或达到阈值时统一flush。
+        # 计数在事件循环线程累加、在后台刷新线程读取并清零，需加锁；flush本身串行执行
+        self._pending_flush = 0
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_interval = CFG.MILVUS_FLUSH_INTERVAL
+        self._flush_max_pending = CFG.MILVUS_FLUSH_MAX_PENDING
+        
+        # 已确认存在的题目ID的LRU缓存。只缓存“存在”：其他进程或客户端随时可能写入同一ID，
+        # 缓存“不存在”会放过重复主键
+        self._id_cache: "OrderedDict[str, None]" = OrderedDict()
+        self._id_cache_size = CFG.CACHE_SIZE
+        self._batch_size = CFG.MILVUS_BATCH_SIZE
+        
+        # 题目ID的布隆过滤器（可选），用于跳过“肯定不存在”的查询；
+        # 连接时从集合全量预热完成后才启用
+        self._id_bloom: Optional[ScalableBloomFilter] = None
+        
     @retry(MilvusException, tries=3, delay=2, backoff=2)
     def connect(self):
         """连接到Milvus数据库"""
         try:
             # 检查连接是否已存在
             if connections.has_connection("default"):
+                # 探测间隔内已确认连接有效，直接复用
+                if self.connected and time.monotonic() - self._last_probe < self._probe_interval:
+                    return
+                
                 try:
                     # 测试连接
                     utility.get_server_version()
-                    self.connected = True
-                    logger.info("Milvus连接已存在且有效")
-                    return
                 except Exception:
                     # 连接无效，重新连接
                     connections.disconnect("default")
+                else:
+                    # 上次连接未通过集合检查（如向量维度不一致）时重新检查，不能直接复用
+                    if self.collection is None:
+                        self._ensure_collection_exists()
+                    self.connected = True
+                    self._last_probe = time.monotonic()
+                    logger.info("Milvus连接已存在且有效")
+                    return
             
             # 创建新连接
             connections.connect(
@@ -50,6 +114,7 @@ class MilvusClient:
             )
             
             self.connected = True
+            self._last_probe = time.monotonic()
             logger.info(f"成功连接到Milvus服务器: {self.host}:{self.port}")
             
             # 确保集合存在
@@ -59,25 +124,90 @@ class MilvusClient:
             logger.error(f"连接Milvus服务器失败: {str(e)}")
             raise
     
+    def is_healthy(self) -> bool:
+        """返回Milvus连接状态，仅在超过探测间隔后才重新探测"""
+        if time.monotonic() - self._last_probe < self._probe_interval:
+            return self.connected
+        
+        try:
+            self.connect()
+        except Exception:
+            # 探测失败同样计入间隔，避免每次健康检查都重连
+            self._last_probe = time.monotonic()
+        return self.connected
+    
+    def _set_vector_type(self, vector_type: DataType):
+        """设置向量字段类型及写入、查询时使用的numpy精度"""
+        if vector_type not in (DataType.FLOAT_VECTOR, DataType.FLOAT16_VECTOR):
+            raise ValueError(f"不支持的向量类型: {vector_type.name}")
+        self.vector_type = vector_type
+        self._vector_dtype = np.float16 if vector_type == DataType.FLOAT16_VECTOR else np.float32
+    
     def _ensure_collection_exists(self):
         """确保集合存在，如果不存在则创建"""
         if not utility.has_collection(self.collection_name):
             self._create_collection()
         else:
-            # 加载集合
-            self.collection = Collection(self.collection_name)
+            # 加载集合；先校验schema，通过后才赋给self.collection，
+            # 校验失败时集合保持未设置，下次连接会重新检查
+            collection = Collection(self.collection_name)
+            
+            # 已有集合以其实际的向量字段类型为准，维度必须与模型输出一致
+            for field in collection.schema.fields:
+                if field.name == "vector":
+                    dim = int(field.params.get("dim", 0))
+                    if dim != self.vector_dim:
+                        raise ValueError(f"集合向量维度 {dim} 与模型输出维度 {self.vector_dim} 不一致")
+                    self._set_vector_type(field.dtype)
+            
+            self.collection = collection
             logger.info(f"已加载集合: {self.collection_name}")
             
             # 检查索引是否存在
             if not self._has_index():
                 self._create_index()
+        
+        # 启动时加载集合到内存，搜索路径不再逐次检查加载状态
+        self.collection.load()
+        logger.info(f"集合已加载到内存: {self.collection_name}")
+        
+        if CFG.MILVUS_ID_BLOOM_ENABLED and self._id_bloom is None:
+            self._build_id_bloom()
+    
+    def _build_id_bloom(self):
+        """从集合中读取全部题目ID，构建布隆过滤器"""
+        try:
+            id_bloom = ScalableBloomFilter(
+                initial_capacity=100_000,
+                error_rate=0.001
+            )
+            iterator = self.collection.query_iterator(
+                batch_size=self._batch_size * 10,
+                expr="question_id != ''",
+                output_fields=["question_id"]
+            )
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    for row in rows:
+                        id_bloom.add(row["question_id"])
+            finally:
+                iterator.close()
+            
+            self._id_bloom = id_bloom
+            logger.info(f"题目ID布隆过滤器已构建，共 {len(id_bloom)} 个ID")
+        except Exception as e:
+            # 预热失败时不启用布隆过滤器，所有检查仍走查询
+            logger.error(f"构建题目ID布隆过滤器失败: {str(e)}")
     
     def _create_collection(self):
         """创建集合和字段"""
         # 定义字段
         fields = [
             FieldSchema(name="question_id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
-            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=self.vector_dim),
+            FieldSchema(name="vector", dtype=self.vector_type, dim=self.vector_dim),
             FieldSchema(name="metadata", dtype=DataType.JSON, optional=True)
         ]
         
@@ -116,8 +246,75 @@ class MilvusClient:
         except Exception:
             return False
     
+    def _record_written_id(self, question_id: str):
+        """记录成功写入的题目ID"""
+        self._cache_id(question_id)
+        if self._id_bloom is not None:
+            self._id_bloom.add(question_id)
+    
+    def _cache_id(self, question_id: str):
+        """记录已存在的题目ID，超出容量时淘汰最久未使用的记录"""
+        self._id_cache[question_id] = None
+        self._id_cache.move_to_end(question_id)
+        if len(self._id_cache) > self._id_cache_size:
+            self._id_cache.popitem(last=False)
+    
+    def _mark_pending_flush(self, count: int):
+        """累计待刷新的插入条数，达到阈值时立即刷新"""
+        with self._pending_lock:
+            self._pending_flush += count
+            should_flush = self._pending_flush >= self._flush_max_pending
+        if should_flush:
+            self.flush_now()
+    
+    def flush_now(self) -> int:
+        """立即刷新所有待刷新的插入数据，返回本次刷新的条数"""
+        with self._flush_lock:
+            with self._pending_lock:
+                pending = self._pending_flush
+                if pending == 0 or self.collection is None:
+                    return 0
+                self._pending_flush = 0
+            
+            try:
+                self.collection.flush()
+                logger.info(f"已刷新 {pending} 条待刷新的题目向量")
+                return pending
+            except Exception as e:
+                # 刷新失败时保留计数，等待下次重试
+                with self._pending_lock:
+                    self._pending_flush += pending
+                logger.error(f"刷新集合失败: {str(e)}")
+                raise
+    
+    async def _flush_periodically(self):
+        """后台任务：按固定间隔刷新待刷新的数据"""
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await asyncio.to_thread(self.flush_now)
+            except Exception:
+                # 错误已在flush_now中记录，继续下一轮
+                pass
+    
+    def start_flush_task(self):
+        """启动后台刷新任务"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+    
+    async def stop_flush_task(self):
+        """停止后台刷新任务，并刷新剩余数据"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        self.flush_now()
+    
     @retry(MilvusException, tries=3, delay=1, backoff=2)
-    def insert(self, question_id: str, vector: List[float], metadata: Optional[Dict[str, Any]] = None) -> bool:
+    def insert(self, question_id: str, vector: np.ndarray, metadata: Optional[Dict[str, Any]] = None) -> bool:
         """插入单个向量数据"""
         try:
             if not self.connected:
@@ -126,33 +323,38 @@ class MilvusClient:
             # 准备数据
             data = [
                 [question_id],
-                [vector],
+                [np.asarray(vector, dtype=self._vector_dtype)],
                 [metadata if metadata else {}]
             ]
             
             # 插入数据
             self.collection.insert(data)
-            self.collection.flush()
+            self._record_written_id(question_id)
             logger.info(f"已插入题目向量: {question_id}")
+            self._mark_pending_flush(1)
             return True
         except Exception as e:
             logger.error(f"插入题目向量失败: {str(e)}")
             raise
     
     @retry(MilvusException, tries=3, delay=1, backoff=2)
-    def batch_insert(self, data: List[Tuple[str, List[float], Optional[Dict[str, Any]]]]) -> bool:
+    def batch_insert(self, data: List[Tuple[str, np.ndarray, Optional[Dict[str, Any]]]]) -> bool:
         """批量插入向量数据"""
         try:
             if not self.connected:
                 self.connect()
             
-            # 准备数据
-            question_ids = [item[0] for item in data]
-            vectors = [item[1] for item in data]
-            metadatas = [item[2] if item[2] else {} for item in data]
+            if not data:
+                return True
+            
+            # 准备数据：一次遍历完成行转列，向量转为集合精度的连续矩阵，
+            # 分批切片只产生视图，不复制数据
+            question_ids, vectors, metadatas = map(list, zip(*data))
+            metadatas = [metadata or {} for metadata in metadatas]
+            vectors = np.asarray(vectors, dtype=self._vector_dtype)
             
             # 分批次插入
-            batch_size = settings.MILVUS_BATCH_SIZE
+            batch_size = self._batch_size
             for i in range(0, len(data), batch_size):
                 batch_end = min(i + batch_size, len(data))
                 batch_data = [
@@ -163,24 +365,22 @@ class MilvusClient:
                 self.collection.insert(batch_data)
                 logger.info(f"已插入批次 {i//batch_size + 1}，包含 {batch_end - i} 个题目向量")
             
-            self.collection.flush()
+            for question_id in question_ids:
+                self._record_written_id(question_id)
             logger.info(f"批量插入完成，共 {len(data)} 个题目向量")
+            self._mark_pending_flush(len(data))
             return True
         except Exception as e:
             logger.error(f"批量插入失败: {str(e)}")
             raise
     
     @retry(MilvusException, tries=3, delay=1, backoff=2)
-    def search(self, vector: List[float], top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    def search(self, vector: np.ndarray, top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """搜索相似向量"""
         try:
             if not self.connected:
                 self.connect()
             
-            # 确保集合已加载
-            if not self.collection.is_loaded:
-                self.collection.load()
-            
             # 构建搜索参数
             search_params = {
                 "metric_type": self.metric_type,
@@ -190,36 +390,44 @@ class MilvusClient:
             # 构建过滤表达式
             expr = None
             if filters:
-                # 简单的过滤表达式构建，实际应用中可能需要更复杂的逻辑
-                conditions = []
-                for key, value in filters.items():
-                    if isinstance(value, str):
-                        conditions.append(f"metadata['{key}'] == '{value}'")
-                    else:
-                        conditions.append(f"metadata['{key}'] == {value}")
-                expr = " && ".join(conditions)
+                # 按过滤条件的形状（键和值类型）复用已编译的模板
+                template = _compile_filter_template(
+                    tuple(filters),
+                    tuple(map(type, filters.values()))
+                )
+                expr = template(*filters.values())
             
             # 执行搜索
             start_time = time.time()
-            results = self.collection.search(
-                data=[vector],
-                anns_field="vector",
-                param=search_params,
-                limit=top_k,
-                expr=expr,
-                output_fields=["question_id", "metadata"]
-            )
+            search_kwargs = {
+                "data": [np.asarray(vector, dtype=self._vector_dtype)],
+                "anns_field": "vector",
+                "param": search_params,
+                "limit": top_k,
+                "expr": expr,
+                "output_fields": ["question_id", "metadata"]
+            }
+            try:
+                results = self.collection.search(**search_kwargs)
+            except MilvusException as e:
+                # 集合被卸载（如内存压力）时重新加载一次后重试，其他错误直接抛出
+                if "not loaded" not in str(e).lower():
+                    raise
+                logger.warning(f"集合未加载，重新加载: {self.collection_name}")
+                self.collection.load()
+                results = self.collection.search(**search_kwargs)
             search_time = time.time() - start_time
             
-            # 处理搜索结果
-            search_results = []
-            for hits in results:
-                for hit in hits:
-                    search_results.append({
-                        "question_id": hit.entity.get("question_id"),
-                        "similarity": hit.distance,
-                        "metadata": hit.entity.get("metadata", {})
-                    })
+            # 处理搜索结果：直接构建最终的响应结构
+            search_results = [
+                {
+                    "question_id": hit.entity.get("question_id"),
+                    "similarity": hit.distance,
+                    "metadata": hit.entity.get("metadata") or {}
+                }
+                for hits in results
+                for hit in hits
+            ]
             
             logger.info(f"搜索完成，耗时: {search_time:.4f}秒，找到 {len(search_results)} 个结果")
             return search_results
@@ -249,6 +457,49 @@ class MilvusClient:
             logger.error(f"查询题目失败: {str(e)}")
             raise
     
+    def question_exists(self, question_id: str) -> bool:
+        """检查题目是否已存在，优先使用本地缓存"""
+        return question_id in self.get_existing_ids([question_id])
+    
+    @retry(MilvusException, tries=3, delay=1, backoff=2)
+    def get_existing_ids(self, question_ids: List[str]) -> Set[str]:
+        """批量查询已存在的题目ID，缓存未命中的ID只发起一次查询"""
+        try:
+            existing_ids = set()
+            missing_ids = []
+            for question_id in question_ids:
+                if question_id in self._id_cache:
+                    self._id_cache.move_to_end(question_id)
+                    existing_ids.add(question_id)
+                else:
+                    missing_ids.append(question_id)
+            
+            # 布隆过滤器判定肯定不存在的ID无需查询
+            if self._id_bloom is not None:
+                missing_ids = [question_id for question_id in missing_ids if question_id in self._id_bloom]
+            
+            if not missing_ids:
+                return existing_ids
+            
+            if not self.connected:
+                self.connect()
+            
+            # 构建查询表达式
+            expr = f"question_id in {missing_ids!r}"
+            
+            # 执行查询
+            results = self.collection.query(expr=expr, output_fields=["question_id"])
+            found_ids = {result["question_id"] for result in results}
+            
+            # 只缓存查到的ID，未查到的ID下次仍需查询
+            for question_id in found_ids:
+                self._cache_id(question_id)
+            
+            return existing_ids | found_ids
+        except Exception as e:
+            logger.error(f"批量查询题目失败: {str(e)}")
+            raise
+    
     @retry(MilvusException, tries=3, delay=1, backoff=2)
     def delete_by_id(self, question_id: str) -> bool:
         """根据ID删除题目"""
@@ -261,6 +512,7 @@ class MilvusClient:
             
             # 执行删除
             result = self.collection.delete(expr=expr)
+            self._id_cache.pop(question_id, None)
             
             if result.delete_count > 0:
                 logger.info(f"已删除题目: {question_id}")
@@ -315,4 +567,4 @@ class MilvusClient:
 
 
 # 创建全局Milvus客户端实例
-milvus_client = MilvusClient()
\ No newline at end of file
+milvus_client = MilvusClient(vector_pipeline.vector_dim)
\ No newline at end of file
@@ -1,93 +1,99 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Optional, Any
-import base64
-import re
+import msgspec
+from msgspec import Meta
+from typing import Annotated, List, Dict, Optional, Any
+import string
 
+# data URI前缀及Base64分隔符
+_DATA_URI_PREFIX = "data:image/"
+_DATA_URI_SEPARATOR = ";base64,"
 
-class QuestionRequest(BaseModel):
+# 批量添加的最大题目数量（请求体格式为 {"questions": [QuestionRequest, ...]}）
+MAX_BATCH_QUESTIONS = 1000
+
+# 标准Base64字母表（不含填充字符）
+_BASE64_ALPHABET = (string.ascii_letters + string.digits + "+/").encode("ascii")
+
+
+def validate_image_base64(v: str) -> str:
+    """验证Base64图片格式，返回去除data URI前缀后的Base64字符串
+
+    只做长度与字符集的轻量检查，真正的解码由向量化管道完成一次。
+    """
+    # 检查是否包含data URI前缀
+    if v.startswith(_DATA_URI_PREFIX):
+        # 提取Base64部分：分隔符紧跟在短前缀之后，查找只扫描前缀长度
+        _, sep, data = v.partition(_DATA_URI_SEPARATOR)
+        if sep:
+            v = data
+
+    # 验证Base64格式：长度为4的倍数，最多两个填充字符，其余均为合法字符
+    body = v.rstrip("=")
+    if not v or len(v) % 4 or len(v) - len(body) > 2:
+        raise ValueError("无效的Base64编码")
+    try:
+        invalid_chars = body.encode("ascii").translate(None, _BASE64_ALPHABET)
+    except UnicodeEncodeError:
+        raise ValueError("无效的Base64编码")
+    if invalid_chars:
+        raise ValueError("无效的Base64编码")
+    return v
+
+
+class QuestionRequest(msgspec.Struct, frozen=True, gc=False):
     """添加单个题目的请求模型"""
-    question_id: str = Field(..., description="题目的唯一标识符")
-    image_base64: str = Field(..., description="题目图片的Base64编码")
-    metadata: Optional[Dict[str, Any]] = Field(None, description="题目相关的元数据")
-    
-    @validator("question_id")
-    def validate_question_id(cls, v):
-        """验证题目ID格式"""
-        if not v or len(v) > 100:
+    question_id: Annotated[str, Meta(description="题目的唯一标识符")]
+    image_base64: Annotated[str, Meta(description="题目图片的Base64编码")]
+    metadata: Annotated[Optional[Dict[str, Any]], Meta(description="题目相关的元数据")] = None
+
+    def __post_init__(self):
+        """解码后校验题目ID与Base64图片格式"""
+        if not self.question_id or len(self.question_id) > 100:
             raise ValueError("题目ID不能为空且长度不能超过100个字符")
-        return v
-    
-    @validator("image_base64")
-    def validate_image_base64(cls, v):
-        """验证Base64图片格式"""
-        # 检查是否包含data URI前缀
-        if v.startswith("data:image/"):
-            # 提取Base64部分
-            match = re.search(r"base64,(.+)", v)
-            if match:
-                v = match.group(1)
-        
-        # 验证Base64格式
-        try:
-            base64.b64decode(v, validate=True)
-        except Exception:
-            raise ValueError("无效的Base64编码")
-        return v
-
-
-class BatchQuestionRequest(BaseModel):
-    """批量添加题目的请求模型"""
-    questions: List[QuestionRequest] = Field(..., description="题目列表")
-    
-    @validator("questions")
-    def validate_questions_length(cls, v):
-        """验证批量添加的题目数量"""
-        if len(v) == 0:
-            raise ValueError("题目列表不能为空")
-        if len(v) > 1000:
-            raise ValueError("批量添加的题目数量不能超过1000个")
-        return v
-
-
-class SearchRequest(BaseModel):
+        msgspec.structs.force_setattr(self, "image_base64", validate_image_base64(self.image_base64))
+
+
+class SearchRequest(msgspec.Struct, frozen=True, gc=False):
     """搜索相似题目的请求模型"""
-    image_base64: str = Field(..., description="搜索图片的Base64编码")
-    top_k: int = Field(5, ge=1, le=100, description="返回的最大结果数量")
-    search_method: str = Field("vector", pattern="^(vector|hybrid)$", description="搜索方法: vector(纯向量) 或 hybrid(混合)")
-    filters: Optional[Dict[str, Any]] = Field(None, description="搜索过滤条件")
-    
-    @validator("image_base64")
-    def validate_search_image_base64(cls, v):
+    image_base64: Annotated[str, Meta(description="搜索图片的Base64编码")]
+    top_k: Annotated[int, Meta(ge=1, le=100, description="返回的最大结果数量")] = 5
+    search_method: Annotated[str, Meta(pattern="^(vector|hybrid)$", description="搜索方法: vector(纯向量) 或 hybrid(混合)")] = "vector"
+    filters: Annotated[Optional[Dict[str, Any]], Meta(description="搜索过滤条件")] = None
+
+    def __post_init__(self):
         """验证搜索图片的Base64格式"""
-        return QuestionRequest.validate_image_base64(cls, v)
+        msgspec.structs.force_setattr(self, "image_base64", validate_image_base64(self.image_base64))
 
 
-class SearchResult(BaseModel):
+class SearchResult(msgspec.Struct, frozen=True, gc=False):
     """单个搜索结果模型"""
-    question_id: str = Field(..., description="题目的唯一标识符")
-    similarity: float = Field(..., description="相似度得分")
-    metadata: Optional[Dict[str, Any]] = Field(None, description="题目相关的元数据")
+    question_id: Annotated[str, Meta(description="题目的唯一标识符")]
+    similarity: Annotated[float, Meta(description="相似度得分")]
+    metadata: Annotated[Optional[Dict[str, Any]], Meta(description="题目相关的元数据")] = None
+
 
+class SearchResponse(msgspec.Struct, frozen=True, gc=False):
+    """搜索响应模型
 
-class SearchResponse(BaseModel):
-    """搜索响应模型"""
-    results: List[SearchResult] = Field(..., description="搜索结果列表")
-    total: int = Field(..., description="总结果数量")
-    search_time: float = Field(..., description="搜索耗时(秒)")
+    results中每个元素与SearchResult结构一致，由milvus_client.search直接构建为字典，
+    编码时不再转换。
+    """
+    results: Annotated[List[SearchResult], Meta(description="搜索结果列表")]
+    total: Annotated[int, Meta(description="总结果数量")]
+    search_time: Annotated[float, Meta(description="搜索耗时(秒)")]
 
 
-class HealthResponse(BaseModel):
+class HealthResponse(msgspec.Struct, frozen=True, gc=False):
     """健康检查响应模型"""
-    status: str = Field(..., description="服务状态")
-    version: str = Field(..., description="服务版本")
-    database: str = Field(..., description="数据库连接状态")
-    uptime: float = Field(..., description="服务运行时间(秒)")
+    status: Annotated[str, Meta(description="服务状态")]
+    version: Annotated[str, Meta(description="服务版本")]
+    database: Annotated[str, Meta(description="数据库连接状态")]
+    uptime: Annotated[float, Meta(description="服务运行时间(秒)")]
 
 
-class StatsResponse(BaseModel):
+class StatsResponse(msgspec.Struct, frozen=True, gc=False):
     """统计信息响应模型"""
-    question_count: int = Field(..., description="题目总数")
-    collection_size: int = Field(..., description="集合大小(bytes)")
-    avg_vector_size: float = Field(..., description="平均向量大小")
-    api_calls: Dict[str, int] = Field(..., description="各API调用次数")
-    error_count: int = Field(..., description="错误总数")
\ No newline at end of file
+    question_count: Annotated[int, Meta(description="题目总数")]
+    collection_size: Annotated[int, Meta(description="集合大小(bytes)")]
+    avg_vector_size: Annotated[float, Meta(description="平均向量大小")]
+    api_calls: Annotated[Dict[str, int], Meta(description="各API调用次数")]
+    error_count: Annotated[int, Meta(description="错误总数")]
@@ -1,102 +1,372 @@
-import towhee
-import base64
+import asyncio
+import contextlib
 import io
+import os
+import queue
+import threading
 import numpy as np
+import pybase64
+import torch
+import xxhash
+from cachebox import TTLCache
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from typing import List, Optional, Dict, Any
+from torchvision.io import ImageReadMode, decode_image, decode_jpeg
+from torchvision.transforms.v2 import InterpolationMode
+from torchvision.transforms.v2 import functional as F
+from transformers import AutoImageProcessor, CLIPModel
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 import logging
 import time
-from functools import lru_cache
-from retry import retry
 
-from .config import settings
+from .config import CFG
 
 logger = logging.getLogger(__name__)
 
+# data URI前缀及其中Base64标记
+_DATA_URI_PREFIX = "data:image/"
+_BASE64_MARKER = "base64,"
+
+# JPEG文件头，用于选择nvJPEG解码路径
+_JPEG_MAGIC = b"\xff\xd8\xff"
+
+# 模型推理的重试次数及可重试的临时性错误（如CUDA显存不足）
+_INFERENCE_ATTEMPTS = 2
+_TRANSIENT_ERRORS = (ConnectionError, TimeoutError, torch.cuda.OutOfMemoryError)
+
+# 批量向量化中无效图片对应的空向量（只读，各位置共享）
+_EMPTY_VECTOR = np.empty(0, dtype=np.float32)
+_EMPTY_VECTOR.setflags(write=False)
+
 
 class VectorizationPipeline:
-    """向量处理管道，使用Towhee和CLIP模型生成图片向量"""
+    """向量处理管道，使用CLIP模型批量生成图片向量"""
     def __init__(self):
         """初始化向量处理管道"""
-        self.cache_size = settings.CACHE_SIZE
-        self.cache_ttl = settings.CACHE_TTL
+        self.cache_size = CFG.CACHE_SIZE
+        self.cache_ttl = CFG.CACHE_TTL
+        self.batch_size = CFG.VECTORIZE_BATCH_SIZE
+        self.pixel_budget = CFG.VECTORIZE_PIXEL_BUDGET
+        
+        # 选择推理设备：GPU上使用FP16权重并开启autocast，CPU上保持FP32
+        if CFG.CLIP_DEVICE == "auto":
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        else:
+            self.device = torch.device(CFG.CLIP_DEVICE)
+        self.dtype = torch.float16 if self.device.type == "cuda" else torch.float32
         
-        # 创建Towhee管道用于向量生成
-        self._create_vectorization_pipeline()
+        # 加载CLIP模型用于向量生成
+        self._load_model()
         
-        # 初始化缓存计数器
+        # 图片解码线程池：Base64解码和图片解码都会释放GIL，可并行处理
+        self._decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="image-decode")
+        
+        # 图片向量缓存：内容哈希 -> 向量，重复图片跳过解码和推理，过期时间为CACHE_TTL
+        self._vector_cache = TTLCache(self.cache_size, self.cache_ttl)
+        
+        # 初始化缓存计数器；向量化在线程池中并发执行，计数更新需加锁
         self.cache_hits = 0
         self.cache_misses = 0
+        self._stats_lock = threading.Lock()
     
-    def _create_vectorization_pipeline(self):
-        """创建Towhee向量生成管道"""
+    def _load_model(self):
+        """加载CLIP模型，并从预处理器配置中读取缩放尺寸和归一化常量"""
         try:
-            # 使用Towhee的新API创建图片向量化管道
-            self.pipeline = (
-                towhee.pipe.input("image")
-                .map("image", "decoded_image", towhee.ops.image_decode())
-                .map("decoded_image", "vector", towhee.ops.image_embedding.clip())
-                .output("vector")
-            )
-            logger.info("成功创建Towhee向量生成管道")
+            self.processor = AutoImageProcessor.from_pretrained(CFG.CLIP_MODEL_NAME, use_fast=True)
+            self.model = CLIPModel.from_pretrained(CFG.CLIP_MODEL_NAME).to(self.device, dtype=self.dtype).eval()
+            self.vector_dim = self.model.config.projection_dim
+            
+            # 预处理常量只计算一次：缩短边尺寸、中心裁剪尺寸，
+            # 以及把 (x/255 - mean)/std 合并成 x*scale + shift 的设备张量
+            self._resize_size = self.processor.size["shortest_edge"]
+            self._crop_size = [self.processor.crop_size["height"], self.processor.crop_size["width"]]
+            mean = torch.tensor(self.processor.image_mean, device=self.device).view(1, 3, 1, 1)
+            std = torch.tensor(self.processor.image_std, device=self.device).view(1, 3, 1, 1)
+            self._scale = (1.0 / (255.0 * std)).to(self.dtype)
+            self._shift = (-mean / std).to(self.dtype)
+            logger.info(f"成功加载CLIP模型: {CFG.CLIP_MODEL_NAME}，设备: {self.device}，精度: {self.dtype}")
         except Exception as e:
-            logger.error(f"创建Towhee管道失败: {str(e)}")
+            logger.error(f"加载CLIP模型失败: {str(e)}")
             raise
     
-    def _decode_base64_image(self, base64_str: str) -> Image.Image:
-        """解码Base64字符串为PIL图片"""
+    def _decode_base64_image(self, base64_str: str) -> torch.Tensor:
+        """解码Base64字符串为RGB图片张量 (C, H, W)，dtype为uint8"""
+        return self._decode_batch([base64_str])[0]
+    
+    def _decode_batch(self, base64_strs: List[str]) -> List[torch.Tensor]:
+        """批量解码Base64图片为RGB uint8张量
+
+        多张图片时在线程池中并行解码。CUDA上JPEG只做Base64解码，随后由decode_jpeg
+        一次批量解码（nvJPEG）；其余图片由torchvision在CPU上解码，不支持的格式回退到PIL。
+        """
+        try:
+            if len(base64_strs) > 1:
+                payloads = list(self._decode_pool.map(self._decode_payload, base64_strs))
+            else:
+                payloads = [self._decode_payload(base64_str) for base64_str in base64_strs]
+            
+            images: List[torch.Tensor] = []
+            jpeg_positions = []
+            jpeg_data = []
+            for i, (is_gpu_jpeg, tensor) in enumerate(payloads):
+                images.append(tensor)
+                if is_gpu_jpeg:
+                    jpeg_positions.append(i)
+                    jpeg_data.append(tensor)
+            
+            # GPU上JPEG一次批量解码，nvJPEG不支持的JPEG（如CMYK）逐张回退到CPU
+            if jpeg_data:
+                try:
+                    decoded = decode_jpeg(jpeg_data, mode=ImageReadMode.RGB, device=self.device)
+                except RuntimeError as e:
+                    logger.warning(f"GPU批量解码JPEG失败，回退到CPU解码: {str(e)}")
+                    decoded = [self._decode_on_cpu(data.numpy()) for data in jpeg_data]
+                for position, image in zip(jpeg_positions, decoded):
+                    images[position] = image
+            
+            return images
+        except Exception as e:
+            logger.error(f"解码Base64图片失败: {str(e)}")
+            raise ValueError(f"无效的图片格式: {str(e)}")
+    
+    def _decode_payload(self, base64_str: str) -> Tuple[bool, torch.Tensor]:
+        """解码单个Base64图片
+
+        返回 (是否留给GPU批量解码的JPEG, 张量)：前者为原始JPEG字节，后者为RGB图片张量。
+        """
+        # 检查是否包含data URI前缀
+        if base64_str.startswith(_DATA_URI_PREFIX):
+            # 提取Base64部分：标记紧跟在短前缀之后，切片即可
+            idx = base64_str.find(_BASE64_MARKER, len(_DATA_URI_PREFIX))
+            if idx >= 0:
+                base64_str = base64_str[idx + len(_BASE64_MARKER):]
+        
+        # 解码Base64字符串（SIMD实现；格式已由请求模型校验），
+        # 直接得到可写的bytearray，张量零拷贝地共享这块内存
+        image_data = pybase64.b64decode_as_bytearray(base64_str, validate=False)
+        
+        if self.device.type == "cuda" and image_data.startswith(_JPEG_MAGIC):
+            return True, torch.frombuffer(image_data, dtype=torch.uint8)
+        return False, self._decode_on_cpu(image_data)
+    
+    def _decode_on_cpu(self, image_data: bytearray) -> torch.Tensor:
+        """在CPU上解码图片为 (C, H, W) 张量，torchvision不支持的格式使用PIL"""
         try:
-            # 检查是否包含data URI前缀
-            if base64_str.startswith("data:image/"):
-                # 提取Base64部分
-                import re
-                match = re.search(r"base64,(.+)", base64_str)
-                if match:
-                    base64_str = match.group(1)
-            
-            # 解码Base64字符串
-            image_data = base64.b64decode(base64_str)
-            
-            # 转换为PIL图片
+            image = decode_image(torch.frombuffer(image_data, dtype=torch.uint8), mode=ImageReadMode.RGB)
+            # 动图解码为 (帧数, C, H, W)，与PIL一致只取第一帧
+            if image.ndim == 4:
+                image = image[0]
+            # 16位PNG解码为uint16，按位深缩放到uint8
+            if image.dtype != torch.uint8:
+                image = F.to_dtype(image, torch.uint8, scale=True)
+            return image
+        except RuntimeError:
             image = Image.open(io.BytesIO(image_data))
             
             # 确保图片格式正确
             if image.mode != "RGB":
                 image = image.convert("RGB")
             
-            return image
-        except Exception as e:
-            logger.error(f"解码Base64图片失败: {str(e)}")
-            raise ValueError(f"无效的图片格式: {str(e)}")
+            return torch.from_numpy(np.asarray(image)).permute(2, 0, 1)
     
-    @lru_cache(maxsize=1000)
-    def _get_image_hash(self, base64_str: str) -> str:
-        """获取图片的哈希值，用于缓存"""
-        import hashlib
-        return hashlib.md5(base64_str.encode()).hexdigest()
+    def _get_image_hash(self, base64_str: str) -> int:
+        """获取图片内容的哈希值，作为向量缓存的键
+
+        缓存命中即直接返回向量，使用128位哈希避免不同图片碰撞到同一个键。
+        """
+        return xxhash.xxh3_128_intdigest(base64_str.encode("ascii"))
+    
+    def _lookup_cache(self, base64_strs: List[str]) -> Tuple[List[int], List[Optional[np.ndarray]], List[int]]:
+        """批量查询向量缓存，返回 (哈希列表, 缓存中的向量, 未命中的位置)"""
+        hashes = [self._get_image_hash(base64_str) for base64_str in base64_strs]
+        vectors = [self._vector_cache.get(image_hash) for image_hash in hashes]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        
+        self._record_cache_lookup(len(hashes) - len(missing), len(missing))
+        return hashes, vectors, missing
+    
+    def _record_cache_lookup(self, hits: int, misses: int):
+        """累加缓存命中/未命中次数"""
+        with self._stats_lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+    
+    def _split_batches(self, images: List[torch.Tensor]) -> Iterator[List[torch.Tensor]]:
+        """按数量上限和像素预算把图片切分成推理批次"""
+        batch = []
+        batch_pixels = 0
+        for image in images:
+            image_pixels = image.shape[-2] * image.shape[-1]
+            if batch and (len(batch) >= self.batch_size or batch_pixels + image_pixels > self.pixel_budget):
+                yield batch
+                batch = []
+                batch_pixels = 0
+            batch.append(image)
+            batch_pixels += image_pixels
+        if batch:
+            yield batch
+    
+    def _autocast(self):
+        """GPU上开启FP16自动混合精度，CPU上不做处理"""
+        if self.device.type == "cuda":
+            return torch.autocast(device_type="cuda", dtype=torch.float16)
+        return contextlib.nullcontext()
+    
+    def _prepare_batch(self, images: List[torch.Tensor]) -> torch.Tensor:
+        """预处理一个推理批次，返回推理设备上的pixel_values
+
+        CUDA上先把CPU解码的uint8图片经锁页内存异步拷贝到GPU（比拷贝float像素小4倍），
+        再在GPU上做缩放、裁剪和归一化。
+        """
+        if self.device.type == "cuda":
+            images = [
+                image if image.is_cuda else image.pin_memory().to(self.device, non_blocking=True)
+                for image in images
+            ]
+        return self._preprocess(images)
+    
+    def _preprocess(self, images: List[torch.Tensor]) -> torch.Tensor:
+        """CLIP预处理：在uint8张量上缩放、中心裁剪，堆叠后以推理精度归一化"""
+        cropped = [
+            F.center_crop(
+                F.resize(image, [self._resize_size], interpolation=InterpolationMode.BICUBIC, antialias=True),
+                self._crop_size,
+            )
+            for image in images
+        ]
+        pixel_values = torch.stack(cropped).to(self.dtype)
+        return pixel_values.mul_(self._scale).add_(self._shift)
     
-    @retry(Exception, tries=3, delay=1, backoff=2)
-    def vectorize_image(self, base64_str: str) -> List[float]:
-        """将Base64编码的图片转换为向量"""
+    def _forward(self, pixel_values: torch.Tensor) -> np.ndarray:
+        """对一个批次做前向推理，返回L2归一化后的float32向量矩阵 (N, D)"""
+        with torch.inference_mode(), self._autocast():
+            # 视觉编码器 + 投影层，等价于get_image_features，且不依赖其返回类型
+            pooled = self.model.vision_model(pixel_values=pixel_values).pooler_output
+            features = self.model.visual_projection(pooled)
+            # 在设备上原地完成归一化，不再分配新的特征张量；只把最终结果转回FP32拷贝到CPU
+            features.div_(torch.linalg.vector_norm(features, dim=-1, keepdim=True))
+        return features.float().cpu().numpy()
+    
+    def _forward_with_retry(self, pixel_values: torch.Tensor) -> np.ndarray:
+        """前向推理，遇到临时性错误时重试；其他错误直接抛出"""
+        for attempt in range(1, _INFERENCE_ATTEMPTS + 1):
+            try:
+                return self._forward(pixel_values)
+            except _TRANSIENT_ERRORS as e:
+                if attempt == _INFERENCE_ATTEMPTS:
+                    raise
+                logger.warning(f"模型推理失败，重试第 {attempt} 次: {str(e)}")
+                if isinstance(e, torch.cuda.OutOfMemoryError):
+                    # 释放缓存的显存块后再重试
+                    torch.cuda.empty_cache()
+    
+    def _embed_images(self, images: List[torch.Tensor]) -> np.ndarray:
+        """对已解码的图片分批做一次前向推理，返回L2归一化后的向量矩阵 (N, D)"""
+        return self._concat([
+            self._forward_with_retry(self._prepare_batch(batch)) for batch in self._split_batches(images)
+        ])
+    
+    def _concat(self, outputs: List[np.ndarray]) -> np.ndarray:
+        """合并各批次的向量矩阵，只有一个批次时直接返回"""
+        if len(outputs) == 1:
+            return outputs[0]
+        if not outputs:
+            return np.empty((0, self.vector_dim), dtype=np.float32)
+        return np.concatenate(outputs)
+    
+    def _embed_pipelined(self, base64_strs: List[str]) -> np.ndarray:
+        """以生产者/消费者流水线完成解码和推理
+
+        生产者线程逐批解码、预处理下一批（CUDA上在独立的流中完成拷贝和预处理），
+        当前线程同时对上一批做前向推理；队列最多缓存2批，限制已解码张量占用的内存。
+        任一图片解码失败则抛出ValueError。
+        """
+        if len(base64_strs) <= self.batch_size:
+            return self._embed_images(self._decode_batch(base64_strs))
+        
+        batches: queue.Queue = queue.Queue(maxsize=2)
+        stopped = threading.Event()
+        
+        def produce():
+            stream = torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+            try:
+                for start in range(0, len(base64_strs), self.batch_size):
+                    images = self._decode_batch(base64_strs[start:start + self.batch_size])
+                    if stream is not None:
+                        # nvJPEG在当前线程的默认流上解码：拷贝流需等待解码完成，
+                        # 并登记解码结果在拷贝流上使用，避免显存被提前复用
+                        stream.wait_stream(torch.cuda.current_stream(self.device))
+                        for image in images:
+                            if image.is_cuda:
+                                image.record_stream(stream)
+                    for batch in self._split_batches(images):
+                        if stopped.is_set():
+                            return
+                        event = None
+                        with torch.cuda.stream(stream) if stream is not None else contextlib.nullcontext():
+                            pixel_values = self._prepare_batch(batch)
+                            if stream is not None:
+                                event = torch.cuda.Event()
+                                event.record(stream)
+                        batches.put((pixel_values, event))
+                batches.put(None)
+            except Exception as e:
+                batches.put(e)
+        
+        producer = threading.Thread(target=produce, name="vectorize-producer", daemon=True)
+        producer.start()
+        
+        outputs = []
+        try:
+            while True:
+                item = batches.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                pixel_values, event = item
+                if event is not None:
+                    # 等待拷贝流完成该批次，并告知分配器张量在计算流上使用
+                    current_stream = torch.cuda.current_stream(self.device)
+                    current_stream.wait_event(event)
+                    pixel_values.record_stream(current_stream)
+                outputs.append(self._forward_with_retry(pixel_values))
+        finally:
+            # 提前退出时通知生产者停止，并清空队列避免其阻塞在put上
+            stopped.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        return self._concat(outputs)
+    
+    def vectorize_image(self, base64_str: str) -> np.ndarray:
+        """将Base64编码的图片转换为向量（只读的float32数组）
+
+        请求模型已去除data URI前缀并做过格式检查，这里是唯一一次Base64解码。
+        解码失败立即抛出ValueError，只有模型推理的临时性错误会重试。
+        """
         try:
             # 记录开始时间
             start_time = time.time()
             
+            # 查询向量缓存
+            image_hash = self._get_image_hash(base64_str)
+            vector = self._vector_cache.get(image_hash)
+            if vector is not None:
+                self._record_cache_lookup(1, 0)
+                return vector
+            self._record_cache_lookup(0, 1)
+            
             # 解码图片
             image = self._decode_base64_image(base64_str)
             
-            # 使用Towhee管道生成向量
-            result = self.pipeline(image=image).get()
-            
-            # 确保结果是列表格式
-            if isinstance(result, np.ndarray):
-                vector = result.tolist()
-            elif isinstance(result, dict) and "vector" in result:
-                vector = result["vector"]
-                if isinstance(vector, np.ndarray):
-                    vector = vector.tolist()
-            else:
-                vector = list(result)
+            # 使用CLIP模型生成向量
+            vector = self._embed_images([image])[0]
+            # 向量与缓存共享，设为只读防止调用方修改缓存内容
+            vector.setflags(write=False)
+            self._vector_cache[image_hash] = vector
             
             # 记录处理时间
             process_time = time.time() - start_time
@@ -107,22 +377,84 @@ class VectorizationPipeline:
             logger.error(f"图片向量化失败: {str(e)}")
             raise
     
-    def batch_vectorize(self, base64_strs: List[str]) -> List[List[float]]:
-        """批量处理图片向量化"""
-        vectors = []
+    def vectorize_images(self, base64_strs: List[str]) -> np.ndarray:
+        """批量将Base64编码的图片转换为向量
+
+        缓存未命中的图片按批次流水线解码和推理，推理的临时性错误按批次重试；
+        任一图片失败则整体失败。
+        返回只读的float32矩阵 (N, D)，各行与输入顺序一一对应。
+        """
+        try:
+            start_time = time.time()
+            
+            # 先查缓存，只对未命中的图片解码和推理
+            hashes, cached, missing = self._lookup_cache(base64_strs)
+            
+            if len(missing) == len(base64_strs):
+                # 全部未命中，直接使用推理输出的矩阵
+                vectors = self._embed_pipelined(base64_strs)
+            else:
+                vectors = np.empty((len(base64_strs), self.vector_dim), dtype=np.float32)
+                for i, vector in enumerate(cached):
+                    if vector is not None:
+                        vectors[i] = vector
+                if missing:
+                    # 批量解码、推理，按位置写入结果矩阵
+                    vectors[missing] = self._embed_pipelined([base64_strs[i] for i in missing])
+            
+            # 新生成的向量以行视图写入缓存，结果矩阵设为只读
+            vectors.setflags(write=False)
+            for i in missing:
+                self._vector_cache[hashes[i]] = vectors[i]
+            
+            total_time = time.time() - start_time
+            logger.info(f"批量向量化完成，共 {len(base64_strs)} 个图片，耗时: {total_time:.4f}秒")
+            
+            return vectors
+        except Exception as e:
+            logger.error(f"批量向量化失败: {str(e)}")
+            raise
+    
+    def batch_vectorize(self, base64_strs: List[str]) -> List[np.ndarray]:
+        """批量处理图片向量化
+
+        缓存命中的图片直接返回缓存向量；解码失败的图片对应位置返回空数组，
+        其余图片合并成批次一次推理，结果为同一个矩阵的行视图。
+        """
+        vectors: List[np.ndarray] = [_EMPTY_VECTOR] * len(base64_strs)
         
         try:
             start_time = time.time()
             
-            for i, base64_str in enumerate(base64_strs):
-                try:
-                    vector = self.vectorize_image(base64_str)
-                    vectors.append(vector)
-                    logger.info(f"批量向量化进度: {i+1}/{len(base64_strs)}")
-                except Exception as e:
-                    logger.error(f"第 {i+1} 个图片向量化失败: {str(e)}")
-                    # 对于批量处理，继续处理下一个，而不是整体失败
-                    vectors.append([])  # 或者可以选择其他方式标记失败
+            # 先查缓存，只对未命中的图片解码和推理
+            hashes, cached, missing = self._lookup_cache(base64_strs)
+            for i, vector in enumerate(cached):
+                if vector is not None:
+                    vectors[i] = vector
+            
+            # 先整体流水线处理；存在无效图片时再逐个解码，跳过无效图片
+            try:
+                positions = missing
+                new_vectors = self._embed_pipelined([base64_strs[i] for i in missing])
+            except ValueError:
+                images = []
+                positions = []
+                for i in missing:
+                    try:
+                        images.append(self._decode_base64_image(base64_strs[i]))
+                        positions.append(i)
+                    except Exception as e:
+                        logger.error(f"第 {i+1} 个图片向量化失败: {str(e)}")
+                        # 对于批量处理，继续处理下一个，而不是整体失败
+                
+                # 有效图片批量推理
+                new_vectors = self._embed_images(images) if images else _EMPTY_VECTOR
+            
+            # 写入结果和缓存
+            new_vectors.setflags(write=False)
+            for position, vector in zip(positions, new_vectors):
+                vectors[position] = vector
+                self._vector_cache[hashes[position]] = vector
             
             total_time = time.time() - start_time
             logger.info(f"批量向量化完成，共 {len(base64_strs)} 个图片，耗时: {total_time:.4f}秒，平均: {total_time/len(base64_strs):.4f}秒/张")
@@ -132,24 +464,41 @@ class VectorizationPipeline:
             logger.error(f"批量向量化过程中出现错误: {str(e)}")
             raise
     
+    async def avectorize_image(self, base64_str: str) -> np.ndarray:
+        """vectorize_image的异步版本，在线程中执行，不阻塞事件循环"""
+        return await asyncio.to_thread(self.vectorize_image, base64_str)
+    
+    async def avectorize_images(self, base64_strs: List[str]) -> np.ndarray:
+        """vectorize_images的异步版本，在线程中执行，不阻塞事件循环"""
+        return await asyncio.to_thread(self.vectorize_images, base64_strs)
+    
+    async def abatch_vectorize(self, base64_strs: List[str]) -> List[np.ndarray]:
+        """batch_vectorize的异步版本，在线程中执行，不阻塞事件循环"""
+        return await asyncio.to_thread(self.batch_vectorize, base64_strs)
+    
     def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
+        with self._stats_lock:
+            cache_hits = self.cache_hits
+            cache_misses = self.cache_misses
         return {
             "cache_size": self.cache_size,
-            "cache_hits": self.cache_hits,
-            "cache_misses": self.cache_misses,
-            "hit_rate": self.cache_hits / (self.cache_hits + self.cache_misses) * 100 
-                        if (self.cache_hits + self.cache_misses) > 0 else 0
+            "cached_vectors": len(self._vector_cache),
+            "cache_hits": cache_hits,
+            "cache_misses": cache_misses,
+            "hit_rate": cache_hits / (cache_hits + cache_misses) * 100 
+                        if (cache_hits + cache_misses) > 0 else 0
         }
     
     def clear_cache(self):
         """清除缓存"""
-        # 清除lru_cache
-        self._get_image_hash.cache_clear()
+        # 清除向量缓存
+        self._vector_cache.clear()
         
         # 重置缓存统计
-        self.cache_hits = 0
-        self.cache_misses = 0
+        with self._stats_lock:
+            self.cache_hits = 0
+            self.cache_misses = 0
         
         logger.info("向量处理缓存已清除")
 
@@ -1,23 +1,59 @@
 import logging
 import os
+import secrets
 import time
-import uuid
-from typing import Dict, Any, Optional
+from array import array
+from typing import Dict, Any, Optional, Tuple
 import traceback
+import msgspec
+from cachebox import LRUCache
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 
-# 全局API调用统计
+# 全局JSON编码器，模块加载时创建一次
+_json_encoder = msgspec.json.Encoder()
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """使用msgspec编码器序列化的JSON响应"""
+    def render(self, content: Any) -> bytes:
+        return _json_encoder.encode(content)
+
+
+# API调用统计的端点名称，顺序即计数数组的下标
+API_CALL_NAMES = (
+    "health",
+    "stats",
+    "add_question",
+    "batch_add_question",
+    "get_question",
+    "delete_question",
+    "search"
+)
+(
+    _HEALTH, _STATS, _ADD_QUESTION, _BATCH_ADD_QUESTION,
+    _GET_QUESTION, _DELETE_QUESTION, _SEARCH
+) = range(len(API_CALL_NAMES))
+
+# 路由名称（即main.py中的端点函数名）到计数下标的映射，
+# 路由匹配后Starlette会把路由对象写入scope["route"]，一次字典查找即可定位计数
+_ROUTE_CALL_INDEX = {
+    "health_check": _HEALTH,
+    "get_stats": _STATS,
+    "add_question": _ADD_QUESTION,
+    "batch_add_questions": _BATCH_ADD_QUESTION,
+    "get_question": _GET_QUESTION,
+    "delete_question": _DELETE_QUESTION,
+    "search_similar_questions": _SEARCH
+}
+
+# 各端点调用次数，按下标累加，避免每次请求都做字符串键的哈希查找。
+# 计数和错误数只在中间件中更新，中间件运行在事件循环线程上，读改写之间没有await，
+# 因此不会交错，无需加锁；多worker部署时每个进程各自统计。
+_api_call_counts = array("Q", [0] * len(API_CALL_NAMES))
+
+# 全局统计
 global_stats = {
-    "api_calls": {
-        "health": 0,
-        "stats": 0,
-        "add_question": 0,
-        "batch_add_question": 0,
-        "get_question": 0,
-        "delete_question": 0,
-        "search": 0
-    },
     "error_count": 0,
     "start_time": time.time()
 }
@@ -34,37 +70,61 @@ def setup_logging(log_level: str = "INFO"):
     
     # 设置第三方库的日志级别
     logging.getLogger("pymilvus").setLevel(logging.WARNING)
-    logging.getLogger("towhee").setLevel(logging.WARNING)
+    logging.getLogger("transformers").setLevel(logging.WARNING)
     logging.getLogger("uvicorn").setLevel(logging.INFO)
     logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
     
     return logging.getLogger("vector_search_service")
 
 
+def _count_api_call(scope: Dict[str, Any]):
+    """按匹配到的路由累加API调用次数，未匹配的请求不计数"""
+    route = scope.get("route")
+    if route is not None:
+        index = _ROUTE_CALL_INDEX.get(route.name)
+        if index is not None:
+            _api_call_counts[index] += 1
+
+
+# 高频的监控抓取和探活端点，不记录日志、不生成请求ID
+_UNLOGGED_PATHS = frozenset({"/metrics", "/health"})
+
+# 记录请求体的方法、请求体大小上限及日志中保留的字节数
+_BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+_BODY_LOG_MAX_BYTES = 4096
+_BODY_LOG_PREVIEW = 500
+
+
 async def log_request_middleware(request: Request, call_next):
     """请求日志中间件"""
+    path = request.scope["path"]
+    if path in _UNLOGGED_PATHS:
+        response = await call_next(request)
+        _count_api_call(request.scope)
+        return response
+    
     # 生成请求ID
-    request_id = str(uuid.uuid4())
+    request_id = secrets.token_hex(8)
     request.state.request_id = request_id
     
     # 记录请求开始
     logger = logging.getLogger("vector_search_service")
     logger.info(f"[REQ:{request_id}] {request.method} {request.url}")
     
-    # 记录请求体（如果是JSON）
-    if request.method in ["POST", "PUT", "PATCH"]:
-        try:
-            body = await request.body()
-            if body:
-                content_type = request.headers.get("content-type", "")
-                if "application/json" in content_type:
-                    # 对于JSON请求，记录部分内容（避免太大）
-                    body_str = body.decode("utf-8")
-                    if len(body_str) > 500:
-                        body_str = body_str[:500] + "... [truncated]"
-                    logger.debug(f"[REQ:{request_id}] Request body: {body_str}")
-        except Exception:
-            pass
+    # 记录请求体（仅DEBUG级别下的小型JSON请求，避免把图片上传整体读入内存）
+    if request.method in _BODY_METHODS and logger.isEnabledFor(logging.DEBUG):
+        content_length = request.headers.get("content-length", "")
+        content_type = request.headers.get("content-type", "")
+        if content_length.isdigit() and int(content_length) < _BODY_LOG_MAX_BYTES and "application/json" in content_type:
+            try:
+                body = await request.body()
+                # 先截取原始字节再解码，截断处的不完整字符用替换符表示
+                body_str = body[:_BODY_LOG_PREVIEW].decode("utf-8", "replace")
+                if len(body) > _BODY_LOG_PREVIEW:
+                    body_str += "... [truncated]"
+                logger.debug(f"[REQ:{request_id}] Request body: {body_str}")
+            except Exception:
+                pass
     
     # 执行请求
     start_time = time.time()
@@ -73,21 +133,7 @@ async def log_request_middleware(request: Request, call_next):
         process_time = time.time() - start_time
         
         # 更新API调用统计
-        path = request.url.path
-        if path == "/health":
-            global_stats["api_calls"]["health"] += 1
-        elif path == "/stats":
-            global_stats["api_calls"]["stats"] += 1
-        elif path == "/questions" and request.method == "POST":
-            global_stats["api_calls"]["add_question"] += 1
-        elif path == "/questions/batch" and request.method == "POST":
-            global_stats["api_calls"]["batch_add_question"] += 1
-        elif path.startswith("/questions/") and request.method == "GET":
-            global_stats["api_calls"]["get_question"] += 1
-        elif path.startswith("/questions/") and request.method == "DELETE":
-            global_stats["api_calls"]["delete_question"] += 1
-        elif path == "/search" and request.method == "POST":
-            global_stats["api_calls"]["search"] += 1
+        _count_api_call(request.scope)
         
         # 记录响应
         logger.info(f"[REQ:{request_id}] {response.status_code} {process_time:.4f}s")
@@ -105,7 +151,7 @@ async def log_request_middleware(request: Request, call_next):
         logger.debug(f"[REQ:{request_id}] Stack trace: {error_stack}")
         
         # 返回通用错误响应
-        return JSONResponse(
+        return MsgspecJSONResponse(
             status_code=500,
             content={
                 "error": "Internal Server Error",
@@ -115,21 +161,36 @@ async def log_request_middleware(request: Request, call_next):
         )
 
 
+def get_api_calls() -> Dict[str, int]:
+    """获取各API调用次数"""
+    return dict(zip(API_CALL_NAMES, _api_call_counts))
+
+
 def get_uptime() -> float:
     """获取服务运行时间（秒）"""
     return time.time() - global_stats["start_time"]
 
 
 class RateLimiter:
-    """简单的速率限制器"""
-    def __init__(self, rate_limit: str = "100/minute"):
+    """基于令牌桶的速率限制器
+
+    每个键只保存 [剩余令牌数, 上次检查时间]，每次检查都是O(1)的浮点运算。
+    令牌桶存放在LRU缓存中，客户端数量超过上限时淘汰最久未访问的键。
+    """
+    __slots__ = (
+        "rate_limit", "requests", "limit", "interval",
+        "interval_seconds", "refill_rate", "_last_purge"
+    )
+    
+    def __init__(self, rate_limit: str = "100/minute", max_clients: int = 10_000):
         """初始化速率限制器
         
         Args:
             rate_limit: 速率限制字符串，如 "100/minute" 或 "10/second"
+            max_clients: 最多保留的客户端令牌桶数量
         """
         self.rate_limit = rate_limit
-        self.requests = {}
+        self.requests = LRUCache(maxsize=max_clients)
         
         # 解析速率限制
         parts = rate_limit.split("/")
@@ -148,27 +209,89 @@ class RateLimiter:
             self.interval_seconds = 3600
         else:
             raise ValueError(f"不支持的时间间隔: {self.interval}")
+        
+        # 每秒补充的令牌数
+        self.refill_rate = self.limit / self.interval_seconds
+        
+        # 上次清理闲置令牌桶的时间
+        self._last_purge = time.monotonic()
+    
+    def _purge_stale(self, current_time: float):
+        """清理闲置超过一个时间窗口的令牌桶
+
+        闲置一个窗口后令牌桶必然已补满，与新建的桶等价，删除不影响限流结果。
+        """
+        cutoff = current_time - self.interval_seconds
+        stale_keys = [key for key, bucket in self.requests.items() if bucket[1] < cutoff]
+        for key in stale_keys:
+            del self.requests[key]
+        self._last_purge = current_time
     
     def is_rate_limited(self, key: str) -> bool:
         """检查是否超过速率限制"""
-        current_time = time.time()
-        
-        # 清理过期的请求记录
-        if key in self.requests:
-            # 只保留时间窗口内的请求
-            self.requests[key] = [t for t in self.requests[key] if current_time - t < self.interval_seconds]
-            
-            # 检查是否超过限制
-            if len(self.requests[key]) >= self.limit:
-                return True
-        else:
-            self.requests[key] = []
+        current_time = time.monotonic()
+        
+        # 每个时间窗口清理一次闲置的客户端，限制内存占用
+        if current_time - self._last_purge >= self.interval_seconds:
+            self._purge_stale(current_time)
+        
+        bucket = self.requests.get(key)
+        if bucket is None:
+            # 新客户端：令牌桶满，消耗一个令牌
+            self.requests[key] = [self.limit - 1.0, current_time]
+            return False
+        
+        # 按经过的时间补充令牌，不超过桶容量
+        tokens = min(self.limit, bucket[0] + (current_time - bucket[1]) * self.refill_rate)
+        bucket[1] = current_time
+        
+        # 检查是否超过限制
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return True
         
         # 记录新请求
-        self.requests[key].append(current_time)
+        bucket[0] = tokens - 1.0
         return False
 
 
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """使用msgspec编码器生成JSON响应"""
+    return MsgspecJSONResponse(content, status_code=status_code)
+
+
+# 错误响应体模板缓存：(错误类型, 是否带请求ID) -> (前缀, 中段)
+_error_templates: Dict[Tuple[str, bool], Tuple[bytes, bytes]] = {}
+
+
+def _get_error_template(error_type: str, with_request_id: bool) -> Tuple[bytes, bytes]:
+    """获取错误响应体模板，同一错误类型只编码一次"""
+    key = (error_type, with_request_id)
+    template = _error_templates.get(key)
+    if template is None:
+        prefix = b'{"error":' + _json_encoder.encode(error_type) + b',"message":'
+        middle = b',"request_id":' if with_request_id else b""
+        template = _error_templates[key] = (prefix, middle)
+    return template
+
+
+def error_response(status_code: int, error_type: str, message: str, request_id: Optional[str] = None) -> Response:
+    """生成标准化的错误响应
+
+    响应结构与generate_error_response一致，但直接拼接预先编码的模板，
+    只对message和request_id做JSON编码。
+    """
+    prefix, middle = _get_error_template(error_type, bool(request_id))
+    body = prefix + _json_encoder.encode(message)
+    if request_id:
+        body += middle + _json_encoder.encode(request_id)
+    return Response(
+        content=body + b"}",
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
 def generate_error_response(status_code: int, error_type: str, message: str, request_id: Optional[str] = None) -> Dict[str, Any]:
     """生成标准化的错误响应"""
     response = {
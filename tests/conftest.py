@@ -0,0 +1,28 @@
+import torch
+from transformers import AutoImageProcessor, CLIPConfig, CLIPImageProcessor, CLIPModel
+
+
+# 单元测试不依赖网络：导入app前把CLIP模型和预处理器的加载替换为随机初始化的小模型，
+# 向量维度与正式模型一致（512）
+def _load_tiny_clip_model(*args, **kwargs):
+    torch.manual_seed(0)
+    config = CLIPConfig(
+        text_config={
+            "hidden_size": 32, "intermediate_size": 37, "num_hidden_layers": 1,
+            "num_attention_heads": 2, "vocab_size": 99
+        },
+        vision_config={
+            "hidden_size": 32, "intermediate_size": 37, "num_hidden_layers": 1,
+            "num_attention_heads": 2, "image_size": 32, "patch_size": 8
+        },
+        projection_dim=512
+    )
+    return CLIPModel(config)
+
+
+def _load_tiny_clip_processor(*args, **kwargs):
+    return CLIPImageProcessor(size={"shortest_edge": 32}, crop_size={"height": 32, "width": 32})
+
+
+CLIPModel.from_pretrained = _load_tiny_clip_model
+AutoImageProcessor.from_pretrained = _load_tiny_clip_processor
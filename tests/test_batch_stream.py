@@ -0,0 +1,107 @@
+import asyncio
+import base64
+
+import msgspec
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.main import iter_batch_questions
+from app.models import MAX_BATCH_QUESTIONS
+
+
+IMAGE_BASE64 = base64.b64encode(b"test image").decode("ascii")
+
+
+def make_request(body: bytes, chunk_size: int = 16) -> Request:
+    """构造按固定大小分段推送请求体的请求"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    
+    async def receive():
+        if chunks:
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+    
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+def collect(body: bytes, chunk_size: int = 16):
+    """流式解析请求体，返回解析出的全部题目"""
+    async def run():
+        return [question async for question in iter_batch_questions(make_request(body, chunk_size))]
+    return asyncio.run(run())
+
+
+def make_body(count: int) -> bytes:
+    """生成包含count个题目的批量请求体"""
+    return msgspec.json.encode({
+        "questions": [
+            {"question_id": f"q{i}", "image_base64": IMAGE_BASE64, "metadata": {"index": i}}
+            for i in range(count)
+        ]
+    })
+
+
+def assert_validation_error(body: bytes, message: str):
+    """断言解析请求体时返回包含指定信息的422错误"""
+    with pytest.raises(HTTPException) as exc_info:
+        collect(body)
+    assert exc_info.value.status_code == 422
+    assert message in exc_info.value.detail["message"]
+
+
+# 测试逐段解析出全部题目
+@pytest.mark.parametrize("chunk_size", [1, 16, 1 << 20])
+def test_parse_questions(chunk_size):
+    questions = collect(make_body(5), chunk_size)
+    assert [q.question_id for q in questions] == [f"q{i}" for i in range(5)]
+    assert questions[2].metadata == {"index": 2}
+    assert questions[0].image_base64 == IMAGE_BASE64
+
+
+# 测试空题目列表
+def test_empty_questions():
+    assert_validation_error(b'{"questions": []}', "题目列表不能为空")
+
+
+# 测试缺少questions字段
+def test_missing_questions():
+    assert_validation_error(b'{"items": []}', "题目列表不能为空")
+
+
+# 测试题目数量达到上限
+def test_max_questions():
+    assert len(collect(make_body(MAX_BATCH_QUESTIONS), 4096)) == MAX_BATCH_QUESTIONS
+
+
+# 测试题目数量超过上限
+def test_too_many_questions():
+    assert_validation_error(
+        make_body(MAX_BATCH_QUESTIONS + 1),
+        f"批量添加的题目数量不能超过{MAX_BATCH_QUESTIONS}个"
+    )
+
+
+# 测试第N个题目校验失败时报告其位置
+def test_invalid_question_index():
+    payload = msgspec.json.decode(make_body(5))
+    del payload["questions"][3]["image_base64"]
+    assert_validation_error(msgspec.json.encode(payload), "$.questions[3]")
+
+
+# 测试第N个题目的Base64无效时报告其位置
+def test_invalid_base64_index():
+    payload = msgspec.json.decode(make_body(5))
+    payload["questions"][1]["image_base64"] = "not base64!"
+    assert_validation_error(msgspec.json.encode(payload), "$.questions[1]")
+
+
+# 测试截断的JSON请求体
+def test_truncated_json():
+    assert_validation_error(make_body(3)[:-10], "无效的JSON请求体")
+
+
+# 测试非JSON请求体
+def test_invalid_json():
+    assert_validation_error(b"not json", "无效的JSON请求体")
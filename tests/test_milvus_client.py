@@ -0,0 +1,253 @@
+import ast
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from pymilvus import DataType, FieldSchema
+
+from app import milvus_client as milvus_module
+from app.milvus_client import MilvusClient, _compile_filter_template
+
+
+class FakeCollection:
+    """按表达式在内存中查询、删除题目ID的集合，记录查询次数"""
+    def __init__(self, ids=()):
+        self.ids = set(ids)
+        self.queries = 0
+    
+    def query(self, expr, output_fields):
+        self.queries += 1
+        question_ids = ast.literal_eval(expr.split(" in ", 1)[1])
+        return [{"question_id": question_id} for question_id in question_ids if question_id in self.ids]
+    
+    def delete(self, expr):
+        question_id = ast.literal_eval(expr.split(" == ", 1)[1])
+        deleted = question_id in self.ids
+        self.ids.discard(question_id)
+        return SimpleNamespace(delete_count=int(deleted))
+
+
+@pytest.fixture
+def client():
+    milvus = MilvusClient(512)
+    milvus.collection = FakeCollection({"a", "b"})
+    milvus.connected = True
+    return milvus
+
+
+# 测试已确认存在的ID被缓存，不再查询
+def test_existing_ids_cached(client):
+    assert client.get_existing_ids(["a", "b", "c"]) == {"a", "b"}
+    assert client.collection.queries == 1
+    
+    assert client.get_existing_ids(["a", "b"]) == {"a", "b"}
+    assert client.question_exists("a")
+    assert client.collection.queries == 1
+
+
+# 测试不存在的ID不缓存，其他客户端写入后可以查到
+def test_missing_ids_not_cached(client):
+    assert client.get_existing_ids(["c"]) == set()
+    assert not client.question_exists("c")
+    assert client.collection.queries == 2
+    
+    client.collection.ids.add("c")
+    assert client.get_existing_ids(["a", "c"]) == {"a", "c"}
+    # 只查询缓存未命中的ID
+    assert client.collection.queries == 3
+
+
+# 测试删除后清除缓存
+def test_delete_evicts_cache(client):
+    assert client.question_exists("a")
+    assert client.delete_by_id("a")
+    assert not client.question_exists("a")
+
+
+# 测试缓存容量受上限约束，淘汰最久未访问的ID
+def test_id_cache_bounded(client):
+    client._id_cache_size = 1
+    client.get_existing_ids(["a"])
+    client.get_existing_ids(["b"])
+    assert list(client._id_cache) == ["b"]
+    
+    client.get_existing_ids(["a"])
+    assert client.collection.queries == 3
+
+
+def build_filter_expr(filters):
+    """原始的逐条拼接过滤表达式实现"""
+    conditions = []
+    for key, value in filters.items():
+        if isinstance(value, str):
+            conditions.append(f"metadata['{key}'] == '{value}'")
+        else:
+            conditions.append(f"metadata['{key}'] == {value}")
+    return " && ".join(conditions)
+
+
+def compile_filter_expr(filters):
+    """按过滤条件的形状取模板并填入过滤值"""
+    template = _compile_filter_template(tuple(filters), tuple(map(type, filters.values())))
+    return template(*filters.values())
+
+
+# 测试编译的过滤表达式与原始拼接结果一致
+@pytest.mark.parametrize("filters", [
+    {"subject": "math"},
+    {"grade": 3},
+    {"subject": "math", "grade": 3, "score": 1.5, "active": True},
+    {"subject": "数学", "chapter": "{0}"},
+    {"{key}": "value", "a}b": 1},
+    {"empty": ""},
+])
+def test_filter_template_matches(filters):
+    assert compile_filter_expr(filters) == build_filter_expr(filters)
+
+
+# 测试同一形状的过滤条件复用模板
+def test_filter_template_reused():
+    _compile_filter_template.cache_clear()
+    assert compile_filter_expr({"subject": "math", "grade": 3}) == build_filter_expr({"subject": "math", "grade": 3})
+    assert compile_filter_expr({"subject": "english", "grade": 5}) == build_filter_expr({"subject": "english", "grade": 5})
+    assert _compile_filter_template.cache_info().hits == 1
+    
+    # 值类型不同视为不同形状
+    assert compile_filter_expr({"subject": "math", "grade": "3"}) == build_filter_expr({"subject": "math", "grade": "3"})
+    assert _compile_filter_template.cache_info().misses == 2
+
+
+class FlushCollection:
+    """记录flush调用的集合，可在flush期间执行回调，并检查flush是否重叠"""
+    def __init__(self, during_flush=None):
+        self.during_flush = during_flush
+        self.flushes = 0
+        self.active = 0
+        self.overlapped = False
+    
+    def flush(self):
+        self.active += 1
+        self.overlapped |= self.active > 1
+        if self.during_flush is not None:
+            self.during_flush()
+        time.sleep(0.001)
+        self.flushes += 1
+        self.active -= 1
+
+
+# 测试刷新期间新增的待刷新计数不会丢失
+def test_pending_flush_kept_during_flush():
+    milvus = MilvusClient(512)
+    milvus._flush_max_pending = 1000
+    
+    def insert_from_event_loop():
+        thread = threading.Thread(target=milvus._mark_pending_flush, args=(2,))
+        thread.start()
+        thread.join()
+    
+    milvus.collection = FlushCollection(insert_from_event_loop)
+    milvus._mark_pending_flush(3)
+    assert milvus.flush_now() == 3
+    assert milvus._pending_flush == 2
+
+
+# 测试刷新失败时保留计数
+def test_pending_flush_restored_on_error():
+    milvus = MilvusClient(512)
+    milvus._mark_pending_flush(3)
+    milvus.collection = SimpleNamespace(flush=lambda: (_ for _ in ()).throw(RuntimeError("flush failed")))
+    with pytest.raises(RuntimeError):
+        milvus.flush_now()
+    assert milvus._pending_flush == 3
+
+
+# 测试多线程并发写入与刷新时计数准确，且flush不会并发执行
+def test_concurrent_pending_flush():
+    milvus = MilvusClient(512)
+    milvus._flush_max_pending = 50
+    milvus.collection = FlushCollection()
+    
+    # 收集每次刷新（包括达到阈值时触发的刷新）的条数
+    flushed = []
+    flush_now = milvus.flush_now
+    milvus.flush_now = lambda: flushed.append(flush_now()) or flushed[-1]
+    
+    def insert():
+        for _ in range(500):
+            milvus._mark_pending_flush(1)
+    
+    def flush():
+        for _ in range(50):
+            milvus.flush_now()
+    
+    threads = [threading.Thread(target=insert) for _ in range(4)] + [threading.Thread(target=flush)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    milvus.flush_now()
+    
+    assert not milvus.collection.overlapped
+    assert sum(flushed) == 2000
+    assert milvus._pending_flush == 0
+
+
+class FakeConnections:
+    """内存中的Milvus连接注册表"""
+    def __init__(self):
+        self.aliases = set()
+    
+    def has_connection(self, alias):
+        return alias in self.aliases
+    
+    def connect(self, alias, host, port):
+        self.aliases.add(alias)
+    
+    def disconnect(self, alias):
+        self.aliases.discard(alias)
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """模拟Milvus服务器上已存在的集合，server.dim为其向量维度"""
+    server = SimpleNamespace(dim=768)
+    
+    def make_collection(name):
+        fields = [
+            FieldSchema(name="question_id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
+            FieldSchema(name="vector", dtype=DataType.FLOAT16_VECTOR, dim=server.dim)
+        ]
+        return SimpleNamespace(schema=SimpleNamespace(fields=fields), indexes=[object()], load=lambda: None)
+    
+    monkeypatch.setattr(milvus_module, "connections", FakeConnections())
+    monkeypatch.setattr(milvus_module, "utility", SimpleNamespace(
+        get_server_version=lambda: "v2.4.0",
+        has_collection=lambda name: True
+    ))
+    monkeypatch.setattr(milvus_module, "Collection", make_collection)
+    monkeypatch.setattr(milvus_module.CFG, "MILVUS_ID_BLOOM_ENABLED", False)
+    return server
+
+
+# 测试已有集合的向量维度与模型不一致时每次连接都失败，且不复用该集合
+def test_dimension_mismatch_rejected(fake_server):
+    milvus = MilvusClient(512)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="集合向量维度 768 与模型输出维度 512 不一致"):
+            milvus.connect()
+        assert not milvus.connected
+        assert milvus.collection is None
+        assert milvus.vector_type == DataType.FLOAT_VECTOR
+    
+    # 集合修正后重新连接成功，并采用集合的向量类型
+    fake_server.dim = 512
+    milvus.connect()
+    assert milvus.connected
+    assert milvus.collection is not None
+    assert milvus.vector_type == DataType.FLOAT16_VECTOR
+
+
+# 测试向量维度取自模型输出
+def test_vector_dim_from_model():
+    assert milvus_module.milvus_client.vector_dim == milvus_module.vector_pipeline.vector_dim
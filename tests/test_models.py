@@ -0,0 +1,72 @@
+import base64
+
+import msgspec
+import pytest
+
+from app.models import QuestionRequest, SearchRequest, validate_image_base64
+
+
+IMAGE_BASE64 = base64.b64encode(b"test image data").decode("ascii")
+
+
+# 测试合法的Base64字符串原样返回
+@pytest.mark.parametrize("value", [
+    IMAGE_BASE64,
+    base64.b64encode(b"a").decode("ascii"),
+    base64.b64encode(b"ab").decode("ascii"),
+    base64.b64encode(b"abc").decode("ascii"),
+    base64.b64encode(bytes(range(256))).decode("ascii"),
+])
+def test_valid_base64(value):
+    assert validate_image_base64(value) == value
+
+
+# 测试去除data URI前缀
+@pytest.mark.parametrize("mime", ["png", "jpeg", "webp"])
+def test_data_uri_prefix(mime):
+    assert validate_image_base64(f"data:image/{mime};base64,{IMAGE_BASE64}") == IMAGE_BASE64
+
+
+# 测试data URI前缀后的Base64部分同样需要校验
+@pytest.mark.parametrize("value", ["data:image/png;base64,", "data:image/png;base64,abc"])
+def test_data_uri_invalid_base64(value):
+    with pytest.raises(ValueError, match="无效的Base64编码"):
+        validate_image_base64(value)
+
+
+# 测试请求模型解码后保存去除前缀的Base64
+def test_request_model_strips_data_uri():
+    question = msgspec.json.decode(
+        msgspec.json.encode({"question_id": "q1", "image_base64": f"data:image/png;base64,{IMAGE_BASE64}"}),
+        type=QuestionRequest
+    )
+    assert question.image_base64 == IMAGE_BASE64
+
+
+# 测试无效的Base64字符串
+@pytest.mark.parametrize("value", [
+    "",
+    "abc",
+    "abcde",
+    "ab=c",
+    "a===",
+    "ab!d",
+    "ab d",
+    "abc\n",
+    "题目图片",
+])
+def test_invalid_base64(value):
+    with pytest.raises(ValueError, match="无效的Base64编码"):
+        validate_image_base64(value)
+
+
+# 测试请求模型在解码时校验Base64
+def test_request_models_validate_base64():
+    question = msgspec.json.decode(
+        msgspec.json.encode({"question_id": "q1", "image_base64": IMAGE_BASE64}),
+        type=QuestionRequest
+    )
+    assert question.image_base64 == IMAGE_BASE64
+    
+    with pytest.raises(msgspec.ValidationError, match="无效的Base64编码"):
+        msgspec.json.decode(b'{"image_base64": "abc"}', type=SearchRequest)
@@ -0,0 +1,42 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def get_schema(path: str, method: str, status_code: str = "200"):
+    """读取OpenAPI文档中端点的响应体Schema"""
+    openapi = client.get("/openapi.json").json()
+    return openapi["paths"][path][method]["responses"][status_code]["content"]["application/json"]["schema"]
+
+
+# 测试请求体Schema来自msgspec模型
+def test_request_body_schemas():
+    openapi = client.get("/openapi.json").json()
+    question = openapi["paths"]["/questions"]["post"]["requestBody"]["content"]["application/json"]["schema"]
+    assert question["required"] == ["question_id", "image_base64"]
+    
+    batch = openapi["paths"]["/questions/batch"]["post"]["requestBody"]["content"]["application/json"]["schema"]
+    assert batch["properties"]["questions"]["items"] == question
+    assert batch["properties"]["questions"]["maxItems"] == 1000
+    
+    search = openapi["paths"]["/search"]["post"]["requestBody"]["content"]["application/json"]["schema"]
+    assert search["properties"]["top_k"]["maximum"] == 100
+
+
+# 测试响应体Schema包含字段说明
+def test_response_schemas():
+    health = get_schema("/health", "get")
+    assert health["required"] == ["status", "version", "database", "uptime"]
+    assert health["properties"]["status"]["description"] == "服务状态"
+    
+    stats = get_schema("/stats", "get")
+    assert stats["properties"]["api_calls"]["additionalProperties"] == {"type": "integer"}
+    
+    # 嵌套的搜索结果模型内联展开
+    search = get_schema("/search", "post")
+    result = search["properties"]["results"]["items"]
+    assert result["required"] == ["question_id", "similarity"]
+    assert result["properties"]["similarity"]["description"] == "相似度得分"
@@ -0,0 +1,89 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from app import pipelines
+from app.pipelines import vector_pipeline
+
+
+def encode_image(image: Image.Image, fmt: str, **kwargs) -> bytes:
+    """把PIL图片编码为指定格式的字节"""
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def to_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def png_16bit() -> bytes:
+    """16位灰度PNG，像素值覆盖0~65535"""
+    pixels = (np.arange(256, dtype=np.uint16).reshape(16, 16) * 257)
+    return encode_image(Image.fromarray(pixels), "PNG")
+
+
+def cmyk_jpeg() -> bytes:
+    return encode_image(Image.new("CMYK", (16, 12), (10, 20, 30, 40)), "JPEG")
+
+
+def animated_gif() -> bytes:
+    """两帧动图，第一帧红色、第二帧蓝色"""
+    frames = [Image.new("RGB", (20, 10), color) for color in ("red", "blue")]
+    return encode_image(frames[0], "GIF", save_all=True, append_images=frames[1:])
+
+
+def rgb_png(color="green", size=(24, 18)) -> bytes:
+    return encode_image(Image.new("RGB", size, color), "PNG")
+
+
+# 测试16位PNG按位深缩放为uint8
+def test_decode_16bit_png():
+    image = vector_pipeline._decode_on_cpu(bytearray(png_16bit()))
+    assert image.dtype == torch.uint8
+    assert image.shape == (3, 16, 16)
+    expected = torch.arange(256, dtype=torch.uint8).reshape(16, 16)
+    assert int((image[0].int() - expected.int()).abs().max()) <= 1
+
+
+# 测试CMYK JPEG解码为RGB
+def test_decode_cmyk_jpeg():
+    image = vector_pipeline._decode_on_cpu(bytearray(cmyk_jpeg()))
+    assert image.dtype == torch.uint8
+    assert image.shape == (3, 12, 16)
+
+
+# 测试动图只取第一帧
+def test_decode_animated_gif():
+    image = vector_pipeline._decode_on_cpu(bytearray(animated_gif()))
+    assert image.shape == (3, 10, 20)
+    assert image[:, 0, 0].tolist() == [255, 0, 0]
+
+
+# 测试特殊格式的图片与普通图片混合批量向量化
+def test_vectorize_mixed_formats():
+    vector_pipeline.clear_cache()
+    images = [to_base64(data) for data in (rgb_png(), png_16bit(), cmyk_jpeg(), animated_gif())]
+    vectors = vector_pipeline.vectorize_images(images)
+    assert vectors.shape == (4, vector_pipeline.vector_dim)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-4)
+    
+    assert vector_pipeline.vectorize_image(to_base64(animated_gif())).shape == (vector_pipeline.vector_dim,)
+    assert [len(v) for v in vector_pipeline.batch_vectorize([images[0], images[3]])] == [vector_pipeline.vector_dim] * 2
+
+
+# 测试GPU批量解码JPEG失败时逐张回退到CPU解码
+def test_gpu_jpeg_fallback(monkeypatch):
+    def fail_decode_jpeg(*args, **kwargs):
+        raise RuntimeError("nvJPEG does not support CMYK")
+    
+    monkeypatch.setattr(pipelines, "decode_jpeg", fail_decode_jpeg)
+    monkeypatch.setattr(vector_pipeline, "device", torch.device("cuda"))
+    rgb_jpeg = encode_image(Image.new("RGB", (16, 16), "white"), "JPEG")
+    images = vector_pipeline._decode_batch([to_base64(rgb_jpeg), to_base64(cmyk_jpeg()), to_base64(rgb_png())])
+    assert [tuple(image.shape) for image in images] == [(3, 16, 16), (3, 12, 16), (3, 18, 24)]
+    assert all(image.dtype == torch.uint8 for image in images)
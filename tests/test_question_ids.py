@@ -0,0 +1,97 @@
+import asyncio
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import BATCH_STREAM_CHUNK_SIZE, app, milvus_client, vector_pipeline
+from app.utils import RateLimiter
+
+
+IMAGE_BASE64 = base64.b64encode(b"test image").decode("ascii")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """向量化与Milvus写入替换为内存实现的测试客户端，返回 (客户端, 已写入的题目ID列表)"""
+    inserted = []
+    
+    async def avectorize_image(base64_str):
+        # 让出事件循环，使并发请求在重复检查与写入之间交错执行
+        await asyncio.sleep(0.05)
+        return np.zeros(vector_pipeline.vector_dim, dtype=np.float32)
+    
+    async def avectorize_images(base64_strs):
+        await asyncio.sleep(0.05)
+        return np.zeros((len(base64_strs), vector_pipeline.vector_dim), dtype=np.float32)
+    
+    monkeypatch.setattr(vector_pipeline, "avectorize_image", avectorize_image)
+    monkeypatch.setattr(vector_pipeline, "avectorize_images", avectorize_images)
+    monkeypatch.setattr(milvus_client, "connect", lambda: None)
+    monkeypatch.setattr(milvus_client, "disconnect", lambda: None)
+    monkeypatch.setattr(milvus_client, "start_flush_task", lambda: None)
+    monkeypatch.setattr(milvus_client, "flush_now", lambda: 0)
+    monkeypatch.setattr(milvus_client, "question_exists", lambda question_id: question_id in inserted)
+    monkeypatch.setattr(milvus_client, "get_existing_ids", lambda question_ids: set(question_ids) & set(inserted))
+    monkeypatch.setattr(milvus_client, "insert", lambda question_id, vector, metadata=None: inserted.append(question_id))
+    monkeypatch.setattr(milvus_client, "batch_insert", lambda data: inserted.extend(item[0] for item in data))
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter("100000/second"))
+    
+    with TestClient(app) as test_client:
+        yield test_client, inserted
+    assert not main._pending_question_ids
+
+
+def post_concurrently(test_client, requests):
+    """在同一事件循环上并发发送 (路径, 请求体) 列表中的请求，返回状态码列表"""
+    with ThreadPoolExecutor(len(requests)) as executor:
+        responses = executor.map(lambda request: test_client.post(request[0], json=request[1]), requests)
+        return sorted(response.status_code for response in responses)
+
+
+def batch_body(question_ids):
+    return {"questions": [{"question_id": question_id, "image_base64": IMAGE_BASE64} for question_id in question_ids]}
+
+
+# 测试并发添加同一题目ID时只有一个请求成功
+def test_concurrent_add_same_id(client):
+    test_client, inserted = client
+    question = {"question_id": "q1", "image_base64": IMAGE_BASE64}
+    assert post_concurrently(test_client, [("/questions", question)] * 3) == [201, 409, 409]
+    assert inserted == ["q1"]
+
+
+# 测试并发的批量添加与单个添加共享题目ID时只有一个请求成功
+def test_concurrent_batch_and_single(client):
+    test_client, inserted = client
+    requests = [
+        ("/questions/batch", batch_body(["b1", "b2", "q2"])),
+        ("/questions", {"question_id": "q2", "image_base64": IMAGE_BASE64}),
+        ("/questions/batch", batch_body(["b3", "q2"])),
+    ]
+    assert post_concurrently(test_client, requests) == [201, 409, 409]
+    assert inserted.count("q2") == 1
+
+
+# 测试同一请求内重复的题目ID，无论是否在同一批中都返回相同的409
+@pytest.mark.parametrize("duplicate_position", [1, BATCH_STREAM_CHUNK_SIZE + 1])
+def test_duplicate_ids_in_batch(client, duplicate_position):
+    test_client, inserted = client
+    question_ids = [f"q{i}" for i in range(BATCH_STREAM_CHUNK_SIZE + 2)]
+    question_ids[duplicate_position] = "q0"
+    response = test_client.post("/questions/batch", json=batch_body(question_ids))
+    assert response.status_code == 409
+    assert response.json()["message"] == "题目ID 'q0' 在请求中重复"
+    assert inserted == []
+
+
+# 测试失败的请求释放占用的题目ID，之后可以正常添加
+def test_ids_released_after_conflict(client):
+    test_client, inserted = client
+    assert test_client.post("/questions/batch", json=batch_body(["a", "b", "a"])).status_code == 409
+    assert test_client.post("/questions/batch", json=batch_body(["a", "b"])).status_code == 201
+    assert test_client.post("/questions", json={"question_id": "a", "image_base64": IMAGE_BASE64}).status_code == 409
+    assert inserted == ["a", "b"]
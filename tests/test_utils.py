@@ -0,0 +1,109 @@
+import msgspec
+import pytest
+
+from app import utils
+from app.utils import RateLimiter, error_response, generate_error_response, json_response
+
+
+class FakeClock:
+    """可手动推进的monotonic时钟"""
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(utils.time, "monotonic", fake_clock)
+    return fake_clock
+
+
+# 测试令牌耗尽后限流
+def test_rate_limit_exhausted(clock):
+    limiter = RateLimiter("3/second")
+    assert [limiter.is_rate_limited("a") for _ in range(4)] == [False, False, False, True]
+    # 其他客户端不受影响
+    assert not limiter.is_rate_limited("b")
+
+
+# 测试令牌按时间补充
+def test_rate_limit_refill(clock):
+    limiter = RateLimiter("2/minute")
+    assert not limiter.is_rate_limited("a")
+    assert not limiter.is_rate_limited("a")
+    assert limiter.is_rate_limited("a")
+    
+    # 补充速率为每30秒一个令牌
+    clock.now += 29
+    assert limiter.is_rate_limited("a")
+    clock.now += 2
+    assert not limiter.is_rate_limited("a")
+    assert limiter.is_rate_limited("a")
+    
+    # 闲置足够久后令牌数不超过桶容量
+    clock.now += 3600
+    assert [limiter.is_rate_limited("a") for _ in range(3)] == [False, False, True]
+
+
+# 测试无效的速率限制格式
+@pytest.mark.parametrize("rate_limit", ["100", "100/day", "x/minute"])
+def test_invalid_rate_limit(rate_limit):
+    with pytest.raises(ValueError):
+        RateLimiter(rate_limit)
+
+
+# 测试闲置超过一个时间窗口的令牌桶被清理
+def test_purge_idle_buckets(clock):
+    limiter = RateLimiter("5/second")
+    limiter.is_rate_limited("idle")
+    clock.now += 0.5
+    limiter.is_rate_limited("active")
+    assert len(limiter.requests) == 2
+    
+    clock.now += 0.7
+    limiter.is_rate_limited("active")
+    assert "idle" not in limiter.requests
+    assert "active" in limiter.requests
+    
+    # 被清理的客户端重新访问时等同于新建的满令牌桶
+    assert [limiter.is_rate_limited("idle") for _ in range(6)] == [False] * 5 + [True]
+
+# 测试令牌桶数量受上限约束，淘汰最久未访问的客户端
+def test_max_clients(clock):
+    limiter = RateLimiter("1/hour", max_clients=2)
+    assert not limiter.is_rate_limited("a")
+    assert not limiter.is_rate_limited("b")
+    assert limiter.is_rate_limited("a")
+    assert not limiter.is_rate_limited("c")
+    assert len(limiter.requests) == 2
+    assert "b" not in limiter.requests
+    assert "a" in limiter.requests
+
+
+# 测试限流器实例不再分配__dict__
+def test_rate_limiter_slots():
+    limiter = RateLimiter()
+    assert not hasattr(limiter, "__dict__")
+    with pytest.raises(AttributeError):
+        limiter.extra = 1
+
+# 测试模板拼接的错误响应与generate_error_response编码结果一致
+@pytest.mark.parametrize("error_type,message,request_id", [
+    ("Not Found", "题目ID 'q1' 不存在", "req-1"),
+    ("Validation Error", 'quote " and \\ backslash', None),
+    ("Internal Server Error", "", ""),
+    ("Conflict", "line\nbreak\t\u0001", "9fé"),
+])
+def test_error_response_matches(error_type, message, request_id):
+    response = error_response(400, error_type, message, request_id)
+    expected = json_response(generate_error_response(400, error_type, message, request_id), status_code=400)
+    assert response.status_code == 400
+    assert response.media_type == "application/json"
+    assert response.body == expected.body
+    assert msgspec.json.decode(response.body) == generate_error_response(400, error_type, message, request_id)
+    
+    # 模板缓存命中后结果不变
+    assert error_response(400, error_type, message, request_id).body == expected.body